@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+import argparse
+import concurrent.futures
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import runpy
+import sys
+import time
+import traceback
+
+# Everything a diagram is likely to need is imported up front, numpy
+# included, so the workers forked from here start warm and every
+# definition only pays for itself
+import canvas
+import fit
+import layout
+import layoutcache
+import node
+import parallel
+import route
+from scene import Scene
+
+
+def definitions(directory):
+    # The diagram definitions in the directory, in order. Every .py file is
+    # one, except the ones starting with an underscore.
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(".py") and not name.startswith("_")
+    )
+
+def output_path(source, out_dir, compress=False):
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(out_dir, stem + (".svgz" if compress else ".svg"))
+
+def write_atomic(path, data):
+    # Written next to it and moved over, so a reader never sees half a file
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def build(source):
+    # Runs a definition like running it as a script would. Gives what it
+    # wrote to stdout and what it left behind.
+    stdout = sys.stdout
+    captured = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    sys.stdout = captured
+    try:
+        namespace = runpy.run_path(source, run_name="__main__")
+    except SystemExit as e:
+        # Exiting with success is just the end of the script
+        if e.code not in (None, 0):
+            raise
+        namespace = {}
+    finally:
+        captured.flush()
+        sys.stdout = stdout
+    return (captured.buffer.getvalue(), namespace)
+
+def _result(source, out_dir, compress):
+    return {
+        "name": os.path.basename(source),
+        "path": output_path(source, out_dir, compress),
+        "pid": os.getpid(),
+    }
+
+def render(source, out_dir, compress=False):
+    # Renders one definition into out_dir. A definition either writes the
+    # svg to stdout itself, like main.py, or leaves a Scene in scene to be
+    # drawn. Gives the timings, or the error.
+    result = _result(source, out_dir, compress)
+    start = time.perf_counter()
+    try:
+        # Whatever cache the definition activates is put back afterwards
+        with layoutcache.scoped():
+            (data, namespace) = build(source)
+        built = time.perf_counter()
+        result["build"] = built - start
+
+        if data:
+            result["draw"] = None
+        else:
+            scene = namespace.get("scene")
+            if not isinstance(scene, Scene):
+                raise ValueError("wrote nothing to stdout and left no scene behind")
+            out = io.BytesIO()
+            with canvas.SvgWriter(out) as writer:
+                scene.draw(writer)
+            data = out.getvalue()
+            result["draw"] = time.perf_counter() - built
+
+        if compress:
+            data = gzip.compress(data, compresslevel=9, mtime=0)
+        write_atomic(result["path"], data)
+        result["bytes"] = len(data)
+
+        # Saved now, the workers don't run atexit handlers
+        cache = layoutcache.default()
+        if cache is not None:
+            cache.save()
+    except KeyboardInterrupt:
+        raise
+    except BaseException:
+        # sys.exit in a definition included, it ends that one only
+        result["error"] = traceback.format_exc()
+    result["total"] = time.perf_counter() - start
+    return result
+
+# Where a worker says which definition it's starting on, see render_all
+_started = None
+
+def _start_worker(started=None):
+    # Every worker has one layout cache, from the environment, that all the
+    # definitions it renders share
+    global _started
+    _started = started
+    layoutcache.use_from_env()
+
+def _render_started(source, out_dir, compress):
+    _started.put(source)
+    return render(source, out_dir, compress)
+
+def _run_pool(sources, out_dir, workers, compress, context):
+    # Renders the sources in a pool of their own, giving the results as they
+    # finish. Returns the sources that didn't finish because a worker died,
+    # the ones of those that had started, and the error.
+    started = context.SimpleQueue()
+    unfinished = set()
+    broken = None
+    with concurrent.futures.ProcessPoolExecutor(
+        min(workers, len(sources)), mp_context=context, initializer=_start_worker, initargs=(started,),
+    ) as pool:
+        futures = {pool.submit(_render_started, source, out_dir, compress): source for source in sources}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                yield future.result()
+            except concurrent.futures.process.BrokenProcessPool:
+                unfinished.add(futures[future])
+                broken = traceback.format_exc()
+
+    running = set()
+    while not started.empty():
+        running.add(started.get())
+    running = [source for source in sources if source in running and source in unfinished]
+    unfinished = [source for source in sources if source in unfinished]
+    return (unfinished, running, broken)
+
+def render_all(sources, out_dir, workers=None, compress=False):
+    # Renders the definitions across a pool of worker processes, giving the
+    # results as they finish
+    if workers is None:
+        workers = os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+
+    if workers <= 1 or len(sources) <= 1:
+        _start_worker()
+        for source in sources:
+            yield render(source, out_dir, compress)
+        return
+
+    # A worker that dies takes the whole pool down with it, and everything
+    # that wasn't finished fails. Those go to a fresh pool, except the ones
+    # that were running when it died. If there was only one, that's the one
+    # that crashed. Otherwise each of them gets a pool of its own, to find out.
+    context = parallel._context() or multiprocessing.get_context()
+    rounds = [(list(sources), workers)]
+    while rounds:
+        (todo, n) = rounds.pop()
+        (unfinished, running, broken) = yield from _run_pool(todo, out_dir, n, compress, context)
+        if not unfinished:
+            continue
+
+        if not running:
+            # The pool broke before starting any of them, it would again
+            failed = unfinished
+        elif len(running) == 1:
+            failed = running
+        else:
+            failed = []
+            rounds.extend(([source], 1) for source in reversed(running))
+        for source in failed:
+            result = _result(source, out_dir, compress)
+            result["pid"] = None
+            result["error"] = broken
+            yield result
+
+        rest = [source for source in unfinished if source not in running and source not in failed]
+        if rest:
+            rounds.insert(0, (rest, workers))
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds*1000:.1f}ms"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a directory of diagram definitions")
+    parser.add_argument("directory", help="directory of .py diagram definitions")
+    parser.add_argument("--out", default="out", help="directory to write the svgs to")
+    parser.add_argument("--workers", type=int, help="worker processes, defaults to the number of cpus")
+    parser.add_argument("--compress", action="store_true", help="write gzipped .svgz files")
+    parser.add_argument("--report", help="write the timings as JSON to this file")
+    args = parser.parse_args(argv)
+
+    # The definitions import the modules next to them, like main.py does
+    sys.path.insert(0, os.path.abspath(args.directory))
+
+    sources = definitions(args.directory)
+    start = time.perf_counter()
+    results = []
+    for result in render_all(sources, args.out, args.workers, args.compress):
+        results.append(result)
+        if "error" in result:
+            print(f"{result['name']:>24} FAILED\n{result['error']}", file=sys.stderr)
+        else:
+            print(f"{result['name']:>24} {_ms(result['build']):>10} build {_ms(result['draw']):>10} draw {result['bytes']:>10}B")
+    elapsed = time.perf_counter() - start
+
+    failed = sum("error" in result for result in results)
+    print(f"{len(results) - failed} rendered, {failed} failed in {_ms(elapsed)}")
+
+    if args.report:
+        results.sort(key=lambda result: result["name"])
+        with open(args.report, "w") as f:
+            json.dump({"elapsed": elapsed, "diagrams": results}, f, indent=2)
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+import argparse
+import io
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import canvas
+import node
+from common import (
+    HDir,
+    Point,
+    VDir,
+    path,
+    path_hv,
+    path_hvh,
+    path_vh,
+    path_vhv,
+)
+from node import (
+    Circle,
+    MultiLine,
+    Square,
+    Text,
+)
+from vec import (
+    Affine2,
+    Vec2,
+)
+
+STAGES = ["construct", "anchors", "fit", "size", "draw"]
+
+# Every anchor a shape can be asked for
+_ANCHORS = [
+    (HDir.LEFT,), (HDir.RIGHT,), (VDir.ABOVE,), (VDir.BELOW,),
+    (VDir.ABOVE, HDir.LEFT), (VDir.ABOVE, HDir.RIGHT),
+    (VDir.BELOW, HDir.LEFT), (VDir.BELOW, HDir.RIGHT),
+]
+
+_PATHS = [path_vhv, path_hvh, path_vh, path_hv]
+
+
+class Diagram():
+    # A synthetic diagram: nodes on a grid, alternating squares and circles,
+    # every one with a label, and edges from each row to the one below it
+    def __init__(self, nodes, edges, rotated, seed):
+        self.rng = random.Random(seed)
+        self.count = nodes
+        self.edge_count = edges
+        self.rotated = rotated
+        self.columns = max(1, int(math.sqrt(nodes)))
+
+        self.nodes = []
+        self.labels = []
+        self.edges = []
+        self.fitted = None
+
+    def build(self):
+        rng = self.rng
+        for i in range(self.count):
+            (row, col) = divmod(i, self.columns)
+            t = Affine2.translate(col * 250, row * 300)
+            if rng.random() < self.rotated:
+                # Around the node itself
+                t = t * Affine2.rotz(rng.uniform(-0.2, 0.2))
+
+            pos = Point(t, HDir.MIDDLE, VDir.MIDDLE)
+            if i % 2:
+                shape = Circle(pos, 30)
+            else:
+                shape = Square(pos, 120, 60)
+            self.nodes.append(shape)
+            self.labels.append(Text(f"node {i}", shape.center()))
+
+        # Only rows with one below them can start an edge
+        sources = len(self.nodes) - self.columns
+        for i in range(self.edge_count if sources > 0 else 0):
+            a = rng.randrange(sources)
+            (row, col) = divmod(a, self.columns)
+            route = _PATHS[i % len(_PATHS)]
+            if self.columns > 1:
+                # Another column, so the paths that end sideways have room
+                # for the arrowhead
+                col = (col + rng.randrange(1, self.columns)) % self.columns
+            else:
+                route = path
+            b = (row + 1) * self.columns + col
+            if b >= len(self.nodes):
+                # The last row is short
+                b = len(self.nodes) - 1
+                if b % self.columns == a % self.columns:
+                    route = path
+            if route in (path, path_vhv, path_vh):
+                points = route(self.nodes[a].anchor(VDir.BELOW), self.nodes[b].anchor(VDir.ABOVE))
+            else:
+                points = route(self.nodes[a].anchor(VDir.BELOW, HDir.RIGHT), self.nodes[b].anchor(VDir.ABOVE, HDir.LEFT))
+            self.edges.append(MultiLine(points, 5))
+
+    def elements(self):
+        return self.nodes + self.labels + self.edges
+
+    def anchors(self):
+        for shape in self.nodes:
+            for args in _ANCHORS:
+                shape.anchor(*args)
+
+    def fit(self):
+        self.fitted = node.fit(self.elements(), 20)
+
+    def size(self):
+        canvas.size([elem.bbox() for elem in self.elements()])
+
+    def draw(self):
+        # Uses what the fit stage came up with
+        (fitp, w, h) = self.fitted
+        with canvas.SvgWriter(io.BytesIO()) as out:
+            out.write_preamble((fitp.position, Vec2(w, h)))
+            for elem in self.elements():
+                elem.draw(out)
+            out.write_tail()
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def run(nodes, edges, rotated, repeat, seed):
+    # Every repeat builds a new diagram from the same seed, with the anchor
+    # caches cleared, so the runs are comparable
+    runs = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        node.anchor_cache_clear()
+        diagram = Diagram(nodes, edges, rotated, seed)
+        runs["construct"].append(_timed(diagram.build))
+        runs["anchors"].append(_timed(diagram.anchors))
+        runs["fit"].append(_timed(diagram.fit))
+        runs["size"].append(_timed(diagram.size))
+        runs["draw"].append(_timed(diagram.draw))
+
+    return {
+        stage: {
+            "min": min(times),
+            "median": statistics.median(times),
+            "runs": times,
+        }
+        for stage, times in runs.items()
+    }
+
+def _commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+def compare(base, result):
+    # Ratios of the best times, above 1 is slower than the base
+    lines = []
+    if base["params"] != result["params"]:
+        lines.append(f"note: different parameters, {base['params']}")
+    for stage in STAGES:
+        old = base["stages"].get(stage)
+        new = result["stages"][stage]
+        if old is None:
+            continue
+        ratio = new["min"] / old["min"] if old["min"] else math.inf
+        lines.append(f"{stage:>10} {old['min']*1000:10.2f}ms {new['min']*1000:10.2f}ms {ratio:6.2f}x")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time building, fitting and drawing a synthetic diagram")
+    parser.add_argument("--nodes", type=int, default=2000)
+    parser.add_argument("--edges", type=int, default=2000)
+    parser.add_argument("--rotated", type=float, default=0.25, help="fraction of nodes with a rotation")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    result = {
+        "params": {
+            "nodes": args.nodes,
+            "edges": args.edges,
+            "rotated": args.rotated,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "stages": run(args.nodes, args.edges, args.rotated, args.repeat, args.seed),
+    }
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), result))
+    else:
+        for stage in STAGES:
+            print(f"{stage:>10} {result['stages'][stage]['min']*1000:10.2f}ms")
+
+if __name__ == "__main__":
+    sys.exit(main())
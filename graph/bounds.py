@@ -0,0 +1,204 @@
+import math
+
+from vec import (
+    BACKEND,
+    Mat4,
+    Vec2,
+)
+
+if BACKEND == "numpy":
+    import numpy as np
+else:
+    np = None
+
+
+class Bounds():
+    # An axis aligned box (x0, y0, x1, y1) that shapes are added to. The empty
+    # one has x0 > x1, so anything unioned with it is just that thing. It
+    # unpacks like the extents tuples it replaces.
+    #
+    # The extents of each shape are exact: the corners of a transformed
+    # rectangle, and the closed form extremes of a transformed ellipse,
+    # rather than the corners of its bbox.
+    __slots__ = ["x0", "y0", "x1", "y1"]
+
+    def __init__(self, x0=math.inf, y0=math.inf, x1=-math.inf, y1=-math.inf):
+        self.x0 = x0
+        self.y0 = y0
+        self.x1 = x1
+        self.y1 = y1
+
+    @staticmethod
+    def rect(transform, w, h):
+        # The rectangle from (0, 0) to (w, h), through the transform
+        (a, b, c, d, e, f) = transform.planar()
+
+        xs = []
+        ys = []
+        for (cx, cy) in ((0.0, 0.0), (w, 0.0), (w, h), (0.0, h)):
+            xs.append(a * cx + c * cy + e)
+            ys.append(b * cx + d * cy + f)
+
+        return Bounds(min(xs), min(ys), max(xs), max(ys))
+
+    @staticmethod
+    def ellipse(transform, rx, ry):
+        # The ellipse centered on (0, 0) with radii rx and ry, through the
+        # transform. Its points are (a*rx*cos t + c*ry*sin t + e, ...), which
+        # reach e +- hypot(a*rx, c*ry) along x.
+        (a, b, c, d, e, f) = transform.planar()
+        hw = math.hypot(a * rx, c * ry)
+        hh = math.hypot(b * rx, d * ry)
+        return Bounds(e - hw, f - hh, e + hw, f + hh)
+
+    @staticmethod
+    def circle(transform, r):
+        return Bounds.ellipse(transform, r, r)
+
+    @staticmethod
+    def points(xs, ys):
+        return Bounds(min(xs), min(ys), max(xs), max(ys))
+
+    @staticmethod
+    def rects(planars, ws, hs):
+        # Bounds.rect of many rectangles at once, given the planar() of each
+        # transform
+        if not len(ws):
+            return Bounds()
+        if np is None:
+            return Bounds.union_all(
+                Bounds.rect(_Planar(p), w, h) for (p, w, h) in zip(planars, ws, hs)
+            )
+
+        # The corners are in the z=0 plane, so only the planar part of each
+        # transform matters
+        (a, b, c, d, e, f) = np.asarray(planars, dtype=np.double).reshape(-1, 6).T[:, :, np.newaxis]
+        w = np.asarray(ws, dtype=np.double)
+        h = np.asarray(hs, dtype=np.double)
+
+        zero = np.zeros_like(w)
+        cx = np.stack((zero, w, w, zero), axis=1)
+        cy = np.stack((zero, zero, h, h), axis=1)
+
+        xs = a * cx + c * cy + e
+        ys = b * cx + d * cy + f
+        return Bounds(float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max()))
+
+    @staticmethod
+    def ellipses(planars, rxs, rys):
+        # Bounds.ellipse of many ellipses at once
+        if not len(rxs):
+            return Bounds()
+        if np is None:
+            return Bounds.union_all(
+                Bounds.ellipse(_Planar(p), rx, ry) for (p, rx, ry) in zip(planars, rxs, rys)
+            )
+
+        (a, b, c, d, e, f) = np.asarray(planars, dtype=np.double).reshape(-1, 6).T
+        rx = np.asarray(rxs, dtype=np.double)
+        ry = np.asarray(rys, dtype=np.double)
+        hw = np.hypot(a * rx, c * ry)
+        hh = np.hypot(b * rx, d * ry)
+        return Bounds(float((e - hw).min()), float((f - hh).min()), float((e + hw).max()), float((f + hh).max()))
+
+    @staticmethod
+    def union_all(bounds):
+        out = Bounds()
+        for b in bounds:
+            out.add(b)
+        return out
+
+    def __iter__(self):
+        return iter((self.x0, self.y0, self.x1, self.y1))
+
+    def __eq__(self, other):
+        return isinstance(other, Bounds) and tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return f"Bounds({self.x0}, {self.y0}, {self.x1}, {self.y1})"
+
+    @property
+    def empty(self):
+        return self.x0 > self.x1 or self.y0 > self.y1
+
+    @property
+    def width(self):
+        return self.x1 - self.x0
+
+    @property
+    def height(self):
+        return self.y1 - self.y0
+
+    def add(self, other):
+        # Grows to cover other as well, in place
+        (x0, y0, x1, y1) = other
+        if x0 < self.x0:
+            self.x0 = x0
+        if y0 < self.y0:
+            self.y0 = y0
+        if x1 > self.x1:
+            self.x1 = x1
+        if y1 > self.y1:
+            self.y1 = y1
+        return self
+
+    def union(self, other):
+        return Bounds(self.x0, self.y0, self.x1, self.y1).add(other)
+
+    __or__ = union
+
+    def contains(self, other):
+        # Whether other is strictly inside, not touching any edge
+        (x0, y0, x1, y1) = other
+        return self.x0 < x0 and self.y0 < y0 and x1 < self.x1 and y1 < self.y1
+
+    def pad(self, d):
+        return Bounds(self.x0 - d, self.y0 - d, self.x1 + d, self.y1 + d)
+
+    def extents(self):
+        return (self.x0, self.y0, self.x1, self.y1)
+
+    def size(self):
+        # As (position, size), like canvas.size gives
+        return (Mat4.translate(self.x0, self.y0), Vec2(self.x1 - self.x0, self.y1 - self.y0))
+
+class _Planar():
+    # planar() coefficients that were already taken out of a transform
+    __slots__ = ["coeffs"]
+
+    def __init__(self, coeffs):
+        self.coeffs = coeffs
+
+    def planar(self):
+        return self.coeffs
+
+def of_element(elem):
+    # The bounds of an element, exact if it knows its shape
+    bounds = getattr(elem, "bounds", None)
+    if bounds is not None:
+        return bounds()
+
+    (pos, (w, h)) = elem.bbox()
+    return Bounds.rect(pos, w, h)
+
+def of_elements(elements):
+    # The bounds of all the elements together. Squares and circles are done
+    # in one batch each, everything else one at a time.
+    (rect_planars, ws, hs) = ([], [], [])
+    (circle_planars, rs) = ([], [])
+    out = Bounds()
+    for elem in elements:
+        kind = getattr(elem, "shape", None)
+        if kind == "rect":
+            rect_planars.append(elem.pos.planar())
+            ws.append(elem.w)
+            hs.append(elem.h)
+        elif kind == "circle":
+            circle_planars.append(elem.pos.planar())
+            rs.append(elem.r)
+        else:
+            out.add(of_element(elem))
+
+    out.add(Bounds.rects(rect_planars, ws, hs))
+    out.add(Bounds.ellipses(circle_planars, rs, rs))
+    return out
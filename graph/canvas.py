@@ -1,42 +1,22 @@
-import math
+import gzip
+import io
 
-from vec import (
-    Mat4,
-    Vec2,
-)
+from bounds import Bounds
+from vec import Mat4
 
 
 def size(bboxes):
-    bb_x = math.inf
-    bb_y = math.inf
-    bb_rx = -math.inf
-    bb_by = -math.inf
-    for elem in bboxes:
-        (pos, (w, h)) = elem
-
-        # The logic here is that we calculate that we find the 4 corners of the
-        # bbox, then transform it, and then find the bbox of that new shape.
-        # It's not quite precise, but it's enough for now
-        ps = [
-            Vec2(0, 0, 0),
-            Vec2(w, 0, 0),
-            Vec2(w, h, 0),
-            Vec2(0, h, 0),
-        ]
-
-        for i, p in enumerate(ps):
-            ps[i] = pos * p
-
-        for p in ps:
-            bb_x = min(p.x, bb_x)
-            bb_y = min(p.y, bb_y)
-            bb_rx = max(p.x, bb_rx)
-            bb_by = max(p.y, bb_by)
-
-
-    bb_w = bb_rx - bb_x
-    bb_h = bb_by - bb_y
-    return (Mat4.translate(bb_x, bb_y), Vec2(bb_w, bb_h))
+    # The bboxes are (transform, (w, h)) rectangles, see bounds.Bounds.rects
+    bboxes = list(bboxes)
+    planars = [pos.planar() for (pos, _) in bboxes]
+    ws = [w for (_, (w, _)) in bboxes]
+    hs = [h for (_, (_, h)) in bboxes]
+    return Bounds.rects(planars, ws, hs).size()
+
+def extents(bbox):
+    # A single bbox as (x0, y0, x1, y1)
+    (pos, (w, h)) = bbox
+    return Bounds.rect(pos, w, h).extents()
 
 def size_and_write_preamble(write, bbox_or_bboxes):
     bbox = size(bbox_or_bboxes)
@@ -55,3 +35,117 @@ def write_preamble(write, bbox):
 
 def write_tail(write):
     write("</svg>")
+
+class Defs():
+    # Tracks which reusable definitions (markers and the like) a document
+    # already contains, so every one of them is written only once and the
+    # elements can refer to it by id
+    def __init__(self):
+        self.emitted = set()
+
+    def require(self, write, id, markup):
+        if id in self.emitted:
+            return
+
+        self.emitted.add(id)
+        write_defs(write, markup)
+
+def write_defs(write, markup):
+    write("<defs>\n")
+    write(markup)
+    write("</defs>\n")
+
+def define(write, id, markup):
+    defs = getattr(write, "defs", None)
+    if defs is None:
+        # The bound write method of a writer, like out.write, writes to the
+        # document of that writer
+        defs = getattr(getattr(write, "__self__", None), "defs", None)
+    if defs is None:
+        # A plain write callable has no document we can track, so it gets the
+        # definition every time
+        write_defs(write, markup)
+        return
+
+    defs.require(write, id, markup)
+
+class SvgWriter():
+    # Collects the many small strings the draw methods produce and hands them
+    # to the output in large chunks. An instance can be passed anywhere a
+    # write callable is expected. With compress the output is gzipped, which
+    # is what an .svgz file is.
+    def __init__(self, out, chunk_size=1 << 16, compress=False, compresslevel=9):
+        # Text streams like sys.stdout get their underlying binary buffer,
+        # since we hand over encoded bytes. Ones without a buffer, like
+        # io.StringIO, get the text itself. Whatever was printed to the text
+        # stream can still be in its own buffer, so it's flushed before every
+        # chunk goes under it.
+        self.stream = out if hasattr(out, "buffer") else None
+        if self.stream is not None:
+            self.stream.flush()
+        out = getattr(out, "buffer", out)
+        self.text = isinstance(out, io.TextIOBase)
+        if self.text and compress:
+            raise ValueError("Can't write compressed output to a text stream")
+
+        self.out = out
+        self.chunk_size = chunk_size
+        self.sink = out
+        if compress:
+            self.sink = gzip.GzipFile(fileobj=out, mode="wb", compresslevel=compresslevel)
+
+        self.parts = []
+        self.pending = 0
+        self.owns_out = False
+        self.defs = Defs()
+
+    @staticmethod
+    def open(path, chunk_size=1 << 16, compress=None):
+        if compress is None:
+            compress = path.endswith(".svgz")
+
+        writer = SvgWriter(open(path, "wb"), chunk_size=chunk_size, compress=compress)
+        writer.owns_out = True
+        return writer
+
+    def write(self, s):
+        self.parts.append(s)
+        self.pending += len(s)
+        if self.pending >= self.chunk_size:
+            self.flush()
+
+    __call__ = write
+
+    def flush(self):
+        if self.parts:
+            s = "".join(self.parts)
+            if self.stream is not None:
+                self.stream.flush()
+            self.sink.write(s if self.text else s.encode("utf-8"))
+            self.parts = []
+            self.pending = 0
+
+    def close(self):
+        self.flush()
+        if self.sink is not self.out:
+            self.sink.close()
+
+        if self.owns_out:
+            self.out.close()
+        else:
+            self.out.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def size_and_write_preamble(self, bbox_or_bboxes):
+        size_and_write_preamble(self.write, bbox_or_bboxes)
+
+    def write_preamble(self, bbox):
+        write_preamble(self.write, bbox)
+
+    def write_tail(self):
+        write_tail(self.write)
@@ -4,8 +4,11 @@ from enum import (
     auto,
 )
 
+from reactive import (
+    derived,
+)
 from vec import (
-    Mat4,
+    Affine2,
     Vec2,
 )
 
@@ -52,86 +55,104 @@ class VDir(Enum):
         elif self == VDir.ABOVE:
             return -1
 
+def direction_valign(direction):
+    if direction.is_zero():
+        return VDir.MIDDLE
+
+    theta = direction.angle()
+    theta = (theta + math.tau * 15/16) % math.tau
+    part = math.floor((theta / math.tau) * 8)
+    vdir = [
+        VDir.BELOW,
+        VDir.BELOW,
+        VDir.BELOW,
+        VDir.MIDDLE,
+        VDir.ABOVE,
+        VDir.ABOVE,
+        VDir.ABOVE,
+        VDir.MIDDLE,
+    ][part]
+
+    return vdir
+
+def direction_halign(direction):
+    if direction.is_zero():
+        return HDir.MIDDLE
+
+    theta = direction.angle()
+    theta = (theta + math.tau * 13/16) % math.tau
+    part = math.floor((theta / math.tau) * 8)
+    dir = [
+        HDir.MIDDLE,
+        HDir.LEFT,
+        HDir.LEFT,
+        HDir.LEFT,
+        HDir.MIDDLE,
+        HDir.RIGHT,
+        HDir.RIGHT,
+        HDir.RIGHT,
+    ][part]
+    return dir
+
+def _alignment(halign, valign):
+    y = ({
+        VDir.BELOW: 1,
+        VDir.ABOVE: -1,
+        VDir.MIDDLE: 0, 
+        None: 0
+    })[valign]
+    x = ({
+        HDir.RIGHT: 1,
+        HDir.LEFT: -1,
+        HDir.MIDDLE: 0, 
+        None: 0
+    })[halign]
+    direction = Vec2(x, y).unit()
+    return (direction, direction_halign(direction), direction_valign(direction))
+
+# There are only 16 ways to align a point, so the direction and the octant it
+# falls in are worked out once for each of them instead of for every point.
+# The direction vectors are shared, which is fine since Vec is never changed
+# in place.
+ALIGNMENTS = {
+    (halign, valign): _alignment(halign, valign)
+    for halign in (*HDir, None)
+    for valign in (*VDir, None)
+}
+
 class Point():
-    __slots__ = ["position", "direction"]
+    # origin is only set while a reactive.Tracker is recording, and says how
+    # the point was derived
+    __slots__ = ["position", "direction", "halign", "valign", "origin"]
 
     def __init__(self, position, halign=None, valign=None):
         self.position = position
-        y = ({
-            VDir.BELOW: 1,
-            VDir.ABOVE: -1,
-            VDir.MIDDLE: 0, 
-            None: 0
-        })[valign]
-        x = ({
-            HDir.RIGHT: 1,
-            HDir.LEFT: -1,
-            HDir.MIDDLE: 0, 
-            None: 0
-        })[halign]
-        self.direction = Vec2(x, y).unit()
-
-    @property
-    def valign(self):
-        if self.direction.is_zero():
-            return VDir.MIDDLE
-
-        theta = self.direction.angle()
-        theta = (theta + math.tau * 15/16) % math.tau
-        part = math.floor((theta / math.tau) * 8)
-        vdir = [
-            VDir.BELOW,
-            VDir.BELOW,
-            VDir.BELOW,
-            VDir.MIDDLE,
-            VDir.ABOVE,
-            VDir.ABOVE,
-            VDir.ABOVE,
-            VDir.MIDDLE,
-        ][part]
-
-        return vdir
-
-    @property
-    def halign(self):
-        if self.direction.is_zero():
-            return HDir.MIDDLE
-
-        theta = self.direction.angle()
-        theta = (theta + math.tau * 13/16) % math.tau
-        part = math.floor((theta / math.tau) * 8)
-        dir = [
-            HDir.MIDDLE,
-            HDir.LEFT,
-            HDir.LEFT,
-            HDir.LEFT,
-            HDir.MIDDLE,
-            HDir.RIGHT,
-            HDir.RIGHT,
-            HDir.RIGHT,
-        ][part]
-        return dir
+        self.origin = None
+        (self.direction, self.halign, self.valign) = ALIGNMENTS[(halign, valign)]
 
 def vec_apply(point, f, *args, **kvargs):
     return Point(f(*args, **kvargs), point.halign, point.valign)
 
 def p(x, y, halign=None, valign=None, t=None):
     if t is None:
-        t = Mat4.identity()
+        return Point(Affine2.translate(x, y), halign, valign)
 
-    t = t * Mat4.translate(x, y)
+    t = t * Affine2.translate(x, y)
     return Point(t, halign, valign)
 
 def v2p(vec, halign=None, valign=None):
     return Point(vec, halign, valign)
 
+@derived
 def adjust(point, adjustment):
-    return Point(point.position * Mat4.translate(adjustment[0], adjustment[1]), point.halign, point.valign)
+    return Point(point.position * Affine2.translate(adjustment[0], adjustment[1]), point.halign, point.valign)
 
+@derived
 def tpoint(point, transform):
     # We still need to apply the inverse of the new transform
     return vec_apply(point, lambda: point.position.affine() * transform) 
 
+@derived
 def realign(point, halign=None, valign=None):
     halign = point.halign if halign is None else halign
     valign = point.valign if valign is None else valign
@@ -149,34 +170,49 @@ def path(current, *next_):
     current.extend(next_)
     return current
 
+# The corners the path functions add are derived from the points on either
+# side, so they follow along when those move
+
+@derived
+def _corner(xpoint, ypoint):
+    return p(xpoint.position.as_vec().x, ypoint.position.as_vec().y)
+
+@derived
+def _vmid(xpoint, head, next_):
+    mid = (next_.position.as_vec().y + head.position.as_vec().y)/2
+    return p(xpoint.position.as_vec().x, mid)
+
+@derived
+def _hmid(ypoint, head, next_):
+    mid = (next_.position.as_vec().x + head.position.as_vec().x)/2
+    return p(mid, ypoint.position.as_vec().y)
+
 def path_vh(current, next_):
     current, head = _unlist(current)
 
-    current.append(p(head.position.as_vec().x, next_.position.as_vec().y))
+    current.append(_corner(head, next_))
     current.append(next_)
     return current
 
 def path_hv(current, next_):
     current, head = _unlist(current)
 
-    current.append(p(next_.position.as_vec().x, head.position.as_vec().y))
+    current.append(_corner(next_, head))
     current.append(next_)
     return current
 
 def path_vhv(current, next_):
     current, head = _unlist(current)
 
-    mid = (next_.position.as_vec().y + head.position.as_vec().y)/2
-    current.append(p(head.position.as_vec().x, mid))
-    current.append(p(next_.position.as_vec().x, mid))
+    current.append(_vmid(head, head, next_))
+    current.append(_vmid(next_, head, next_))
     current.append(next_)
     return current
 
 def path_hvh(current, next_):
     current, head = _unlist(current)
 
-    mid = (next_.position.as_vec().x + head.position.as_vec().x)/2
-    current.append(p(mid, head.position.as_vec().y))
-    current.append(p(mid, next_.position.as_vec().y))
+    current.append(_hmid(head, head, next_))
+    current.append(_hmid(next_, head, next_))
     current.append(next_)
     return current
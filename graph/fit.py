@@ -1,3 +1,4 @@
+from bounds import of_elements
 from vec import Vec2
 from common import (
     p,
@@ -14,20 +15,8 @@ class Box():
         self.height = height
 
 def containing(elements, pad):
-    (pos, size) = elements[0].bbox()
-    x_low = pos.x
-    y_low = pos.y
-    x_high = size.x + x_low
-    y_high = size.y + y_low
-
-    for e in elements[1:]:
-        (pos, size) = e.bbox()
-        x_low = min(x_low, pos.x)
-        y_low = min(y_low, pos.y)
-        x_high = max(x_high, pos.x + size.x)
-        y_high = max(y_high, pos.y + size.y)
-
-    return Box(p(x_low - pad, y_low - pad, HDir.RIGHT, VDir.BELOW), x_high - x_low + pad*2, y_high - y_low + pad*2)
+    (x0, y0, x1, y1) = of_elements(elements)
+    return Box(p(x0 - pad, y0 - pad, HDir.RIGHT, VDir.BELOW), x1 - x0 + pad*2, y1 - y0 + pad*2)
 
 
 def grow_box(box, distance, direction):
@@ -0,0 +1,108 @@
+import collections
+import hashlib
+import struct
+
+from parallel import (
+    FragmentWriter,
+    write_fragment,
+)
+from vec import (
+    Affine2,
+    Mat4,
+    Vec,
+    Vec2,
+    VecArray,
+)
+
+
+def content_hash(elem):
+    # A stable hash of what an element looks like, going by its public
+    # attributes, or None if some of them can't be hashed. It's taken for
+    # every element on every render, so all the floats are packed in one go
+    # and everything else goes in as text.
+    tags = [type(elem).__module__, type(elem).__qualname__]
+    floats = []
+    for name, value in vars(elem).items():
+        if name[0] == "_":
+            # Caches, see MultiLine._arc
+            continue
+
+        t = type(value)
+        if t is str:
+            tags.append(f"{name}:s{len(value)}:{value}")
+        elif t is float:
+            tags.append(f"{name}:f")
+            floats.append(value)
+        elif t is int or t is bool or value is None:
+            tags.append(f"{name}:{value!r}")
+        elif t is Affine2:
+            tags.append(f"{name}:A")
+            floats.extend(value.planar())
+        elif t is Mat4:
+            tags.append(f"{name}:M")
+            floats.extend(value.values())
+        elif t is Vec or t is Vec2:
+            tags.append(f"{name}:{t.__name__}")
+            floats.extend((value.x, value.y, value.z))
+        elif t is VecArray:
+            values = value.values()
+            tags.append(f"{name}:R{len(values)}")
+            floats.extend(values)
+        else:
+            return None
+
+    data = "\0".join(tags).encode("utf-8") + struct.pack(f"<{len(floats)}d", *floats)
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+class FragmentCache():
+    # The svg each element was drawn as, by its content hash, so drawing an
+    # element that looks the same as one drawn before just copies the text.
+    # Keep one around between renders of a diagram that only changes a
+    # little, and only the changed elements are formatted again. The
+    # fragments keep the definitions they asked for, so the output is the same
+    # as drawing every element.
+    #
+    # At most max_bytes of text is kept, the least recently used goes first.
+    def __init__(self, max_bytes=32 << 20):
+        self.max_bytes = max_bytes
+        self.fragments = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.fragments)
+
+    def draw(self, write, elem):
+        key = content_hash(elem)
+        if key is None:
+            elem.draw(write)
+            return
+
+        entry = self.fragments.get(key)
+        if entry is not None:
+            self.fragments.move_to_end(key)
+            self.hits += 1
+            write_fragment(write, entry[0])
+            return
+
+        self.misses += 1
+        out = FragmentWriter()
+        elem.draw(out)
+        fragment = out.fragment()
+        write_fragment(write, fragment)
+
+        size = sum(len(part) if type(part) is str else len(part[1]) for part in fragment)
+        self.fragments[key] = (fragment, size)
+        self.size += size
+        while self.size > self.max_bytes and self.fragments:
+            (_, (_, old)) = self.fragments.popitem(last=False)
+            self.size -= old
+
+    def draw_elements(self, write, elements):
+        for elem in elements:
+            self.draw(write, elem)
+
+    def clear(self):
+        self.fragments.clear()
+        self.size = 0
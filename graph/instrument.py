@@ -0,0 +1,183 @@
+import collections
+import functools
+import json
+import os
+import sys
+import time
+
+import common
+import node
+import vec
+
+# Opt in with GRAPH_INSTRUMENT=1 to get the report on stderr after every
+# render, or GRAPH_INSTRUMENT=<path> to have it written there as JSON
+ENV = "GRAPH_INSTRUMENT"
+
+# Counting is done by wrapping things in place, so none of it costs anything
+# until it's enabled
+ALLOCATED = [vec.Vec, vec.VecArray, vec.Mat4, vec.Affine2, common.Point]
+ELEMENTS = [node.Square, node.Circle, node.MultiLine, node.Text]
+# The modules that use numpy, by name, since not all of them are always
+# imported. Only the ones already imported when enabling are counted.
+NUMPY_USERS = ["vec", "bounds", "node", "pointarray", "raster"]
+
+enabled = False
+
+_allocations = collections.Counter()
+_numpy = collections.Counter()
+_elements = collections.defaultdict(lambda: {"count": 0, "seconds": 0.0})
+_patched = []
+# Set while node.draw_lines is timed. The draw calls it makes are part of
+# its time, and counted by it.
+_drawing_lines = False
+
+
+class _CountingNumpy():
+    # Stands in for the numpy module in the modules that use it, counting the
+    # calls that go through it. Types and constants are passed on as they are.
+    def __init__(self, np):
+        self._np = np
+        self._wrapped = {}
+
+    def __getattr__(self, name):
+        wrapped = self._wrapped.get(name)
+        if wrapped is not None:
+            return wrapped
+
+        attr = getattr(self._np, name)
+        if not callable(attr) or isinstance(attr, type):
+            return attr
+
+        wrapped = _CountingCall(name, attr)
+        self._wrapped[name] = wrapped
+        return wrapped
+
+class _CountingCall():
+    def __init__(self, name, fn):
+        self._name = name
+        self._fn = fn
+
+    def __call__(self, *args, **kwargs):
+        _numpy[self._name] += 1
+        return self._fn(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # Like the methods of ufuncs
+        return getattr(self._fn, name)
+
+def _count_init(cls):
+    init = cls.__dict__["__init__"]
+
+    @functools.wraps(init)
+    def wrapper(self, *args, **kwargs):
+        # Subclasses that call this from their own __init__ were counted there
+        if type(self).__init__ is wrapper:
+            _allocations[type(self).__name__] += 1
+        init(self, *args, **kwargs)
+    return wrapper
+
+def _time_method(cls, name, stage):
+    method = cls.__dict__[name]
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if _drawing_lines:
+            return method(self, *args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            entry = _elements[(type(self).__name__, stage)]
+            entry["count"] += 1
+            entry["seconds"] += time.perf_counter() - start
+    return wrapper
+
+def _time_lines(draw_lines):
+    # node.draw_lines draws MultiLines without going through their draw, or
+    # through it without numpy
+    @functools.wraps(draw_lines)
+    def wrapper(write, lines):
+        global _drawing_lines
+        lines = list(lines)
+        start = time.perf_counter()
+        _drawing_lines = True
+        try:
+            return draw_lines(write, lines)
+        finally:
+            _drawing_lines = False
+            entry = _elements[("MultiLine", "draw")]
+            entry["count"] += len(lines)
+            entry["seconds"] += time.perf_counter() - start
+    return wrapper
+
+def _patch(owner, name, value):
+    _patched.append((owner, name, getattr(owner, name)))
+    setattr(owner, name, value)
+
+def enable():
+    global enabled
+    if enabled:
+        return
+    enabled = True
+
+    for cls in ALLOCATED:
+        _patch(cls, "__init__", _count_init(cls))
+    for cls in ELEMENTS:
+        _patch(cls, "__init__", _time_method(cls, "__init__", "construct"))
+        _patch(cls, "draw", _time_method(cls, "draw", "draw"))
+    _patch(node, "draw_lines", _time_lines(node.draw_lines))
+    for name in NUMPY_USERS:
+        module = sys.modules.get(name)
+        if getattr(module, "np", None) is not None:
+            _patch(module, "np", _CountingNumpy(module.np))
+
+def disable():
+    global enabled
+    if not enabled:
+        return
+    enabled = False
+
+    while _patched:
+        (owner, name, value) = _patched.pop()
+        setattr(owner, name, value)
+
+def reset():
+    _allocations.clear()
+    _numpy.clear()
+    _elements.clear()
+
+def report():
+    # Everything counted since the last reset, as plain data
+    elements = {}
+    for (name, stage), entry in sorted(_elements.items()):
+        elements.setdefault(name, {})[stage] = dict(entry)
+
+    return {
+        "allocations": dict(_allocations.most_common()),
+        "numpy": dict(_numpy.most_common()),
+        "elements": elements,
+    }
+
+def dump(out=None):
+    # Writes the report as JSON to the file object or path, or where the
+    # environment variable says
+    if out is None:
+        target = os.environ.get(ENV, "1")
+        out = sys.stderr if target == "1" else target
+
+    if isinstance(out, str):
+        with open(out, "w") as f:
+            json.dump(report(), f, indent=2)
+    else:
+        json.dump(report(), out, indent=2)
+        out.write("\n")
+
+def render_done():
+    # Called at the end of every render. Dumps the report when enabled from
+    # the environment.
+    if enabled and os.environ.get(ENV):
+        dump()
+
+if os.environ.get(ENV):
+    enable()
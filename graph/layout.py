@@ -0,0 +1,330 @@
+import struct
+
+import layoutcache
+from common import (
+    HDir,
+    VDir,
+    p,
+)
+from node import (
+    Circle,
+    MultiLine,
+    Square,
+)
+from vec import BACKEND
+
+if BACKEND == "numpy":
+    from pointarray import PointArray
+else:
+    PointArray = None
+
+
+class Layered():
+    # The result of a layered layout. nodes maps every node to the element
+    # that was placed for it, edges has a MultiLine for every edge in the order
+    # they were given (None for edges from a node to itself, which the layout
+    # doesn't draw), and layers maps every node to the layer it was put in.
+    def __init__(self, nodes, edges, layers):
+        self.nodes = nodes
+        self.edges = edges
+        self.layers = layers
+
+    def elements(self):
+        yield from self.nodes.values()
+        for edge in self.edges:
+            if edge is not None:
+                yield edge
+
+def _break_cycles(nodes, succ):
+    # Find the edges that point back up a depth first search. Reversing those
+    # makes the graph acyclic. Iterative, since the graphs can be deep.
+    state = {}
+    back = set()
+    for root in nodes:
+        if root in state:
+            continue
+
+        state[root] = 1
+        stack = [(root, iter(succ[root]))]
+        while stack:
+            (node, children) = stack[-1]
+            for child in children:
+                s = state.get(child)
+                if s is None:
+                    state[child] = 1
+                    stack.append((child, iter(succ[child])))
+                    break
+                elif s == 1:
+                    back.add((node, child))
+            else:
+                state[node] = 2
+                stack.pop()
+    return back
+
+def _longest_path(nodes, succ, pred):
+    # Every node one below its lowest predecessor, and the order they were
+    # placed in
+    indegree = {n: len(pred[n]) for n in nodes}
+    todo = [n for n in nodes if indegree[n] == 0]
+    layer = {n: 0 for n in todo}
+    order = []
+    while todo:
+        node = todo.pop()
+        order.append(node)
+        for child in succ[node]:
+            layer[child] = max(layer.get(child, 0), layer[node] + 1)
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                todo.append(child)
+
+    # That leaves every source in the top layer, however deep its successors
+    # are, and each layer an edge spans costs a dummy node. Going bottom up,
+    # pull every node with no more edges coming in than going down as far
+    # down as its successors allow, so its predecessors can follow it.
+    for node in reversed(order):
+        if succ[node] and len(pred[node]) <= len(succ[node]):
+            layer[node] = min(layer[child] for child in succ[node]) - 1
+    return layer
+
+def _assign_layers(nodes, succ, pred, edges):
+    # Layered from the top, sinks can still end up far below their
+    # predecessors, and layered from the bottom the same goes for sources.
+    # Which one leaves the edges shorter depends on the graph, so do both.
+    best = None
+    for (layer, sign) in ((_longest_path(nodes, succ, pred), 1), (_longest_path(nodes, pred, succ), -1)):
+        top = min((sign * l for l in layer.values()), default=0)
+        layer = {n: sign * l - top for (n, l) in layer.items()}
+        length = sum(layer[b] - layer[a] for (a, b) in edges)
+        if best is None or length < best[0]:
+            best = (length, layer)
+    return best[1]
+
+def _order(layers, up, down, sweeps):
+    # Barycenter crossing reduction. Each sweep sorts every layer by the mean
+    # position of its neighbours in the layer before it, first going down and
+    # then going up.
+    pos = {}
+    for nodes in layers:
+        for i, n in enumerate(nodes):
+            pos[n] = i
+
+    def sort_by(nodes, neighbours):
+        def key(n):
+            ns = neighbours[n]
+            if not ns:
+                return pos[n]
+            return sum(pos[m] for m in ns) / len(ns)
+
+        nodes.sort(key=key)
+        for i, n in enumerate(nodes):
+            pos[n] = i
+
+    for _ in range(sweeps):
+        for nodes in layers[1:]:
+            sort_by(nodes, up)
+        for nodes in reversed(layers[:-1]):
+            sort_by(nodes, down)
+
+def _coordinates(layers, up, node_gap):
+    # Put every node at the mean x of its neighbours above, pushed right as
+    # needed to keep the order and the spacing
+    x = {}
+    for nodes in layers:
+        cursor = None
+        for n in nodes:
+            ns = [m for m in up[n] if m in x]
+            want = sum(x[m] for m in ns) / len(ns) if ns else 0
+            if cursor is not None:
+                want = max(want, cursor + node_gap)
+            x[n] = want
+            cursor = want
+    return x
+
+def layered(nodes, edges, shape="circle", r=20, w=100, h=50, layer_gap=100, node_gap=80, sweeps=4, radius=5, cache=None):
+    # Lay out a directed graph in layers, top to bottom. nodes is a list of
+    # hashable names and edges a list of (from, to) pairs of them. Cycles are
+    # broken by turning some edges around for the layout, they are still drawn
+    # pointing the right way. Edges that skip layers get a dummy node in every
+    # layer they cross, so they are routed between the nodes.
+    #
+    # With a layoutcache.LayoutCache, or one active, the positions and routes
+    # are stored under the hash of the graph and the parameters, and a later
+    # layout of the same graph just places the elements again.
+    nodes = list(nodes)
+    edges = list(edges)
+    if cache is None:
+        cache = layoutcache.default()
+
+    key = None
+    if cache is not None:
+        key = layoutcache.key_of("layout.layered", nodes, edges, shape, r, w, h, layer_gap, node_gap, sweeps, radius)
+        data = cache.get(key)
+        if data is not None:
+            return _unpack(data, nodes, edges, shape, r, w, h, radius)
+
+    (result, x, y, routes) = _layered(nodes, edges, shape, r, w, h, layer_gap, node_gap, sweeps, radius)
+    if key is not None:
+        cache.put(key, _pack(result, nodes, x, y, routes))
+    return result
+
+def _place(x, y, shape, r, w, h):
+    pos = p(x, y, HDir.MIDDLE, VDir.MIDDLE)
+    if shape == "circle":
+        return Circle(pos, r)
+    elif shape == "square":
+        return Square(pos, w, h)
+    else:
+        raise ValueError(shape)
+
+def _lines(routes, radius):
+    # A MultiLine for every route, a list of (x, y) or None. With numpy the
+    # points of all of them are made in one PointArray, which every line
+    # takes a slice of.
+    if PointArray is None:
+        return [None if route is None else MultiLine([p(x, y) for (x, y) in route], radius) for route in routes]
+
+    coords = [xy for route in routes if route is not None for xy in route]
+    points = PointArray.at([x for (x, _) in coords], [y for (_, y) in coords])
+
+    lines = []
+    start = 0
+    for route in routes:
+        if route is None:
+            lines.append(None)
+            continue
+        stop = start + len(route)
+        lines.append(MultiLine(points[start:stop], radius))
+        start = stop
+    return lines
+
+def _pack(result, nodes, x, y, routes):
+    centers = []
+    for n in nodes:
+        centers.extend((x[n], y[n]))
+    layers = [result.layers[n] for n in nodes]
+
+    header = struct.pack(f"<I{len(centers)}d{len(layers)}i", len(nodes), *centers, *layers)
+    return header + layoutcache.pack_paths(routes)
+
+def _unpack(data, nodes, edges, shape, r, w, h, radius):
+    (n,) = struct.unpack_from("<I", data)
+    at = 4
+    centers = struct.unpack_from(f"<{n * 2}d", data, at)
+    at += n * 16
+    layers = struct.unpack_from(f"<{n}i", data, at)
+    at += n * 4
+    (routes, _) = layoutcache.unpack_paths(data, at)
+
+    placed = {}
+    layer = {}
+    for i, node in enumerate(nodes):
+        placed[node] = _place(centers[2 * i], centers[2 * i + 1], shape, r, w, h)
+        layer[node] = layers[i]
+
+    return Layered(placed, _lines(routes, radius), layer)
+
+def _layered(nodes, edges, shape, r, w, h, layer_gap, node_gap, sweeps, radius):
+    succ = {n: [] for n in nodes}
+    for (a, b) in edges:
+        if a != b:
+            succ[a].append(b)
+
+    back = _break_cycles(nodes, succ)
+    dag = []
+    for (a, b) in edges:
+        if a == b:
+            continue
+        dag.append((b, a) if (a, b) in back else (a, b))
+
+    succ = {n: [] for n in nodes}
+    pred = {n: [] for n in nodes}
+    for (a, b) in dag:
+        succ[a].append(b)
+        pred[b].append(a)
+    layer = _assign_layers(nodes, succ, pred, dag)
+
+    # Split the long edges with dummies, so every edge spans a single layer
+    layers = [[] for _ in range(max(layer.values(), default=-1) + 1)]
+    for n in nodes:
+        layers[layer[n]].append(n)
+
+    up = {n: [] for n in nodes}
+    down = {n: [] for n in nodes}
+    chains = []
+    for i, (a, b) in enumerate(dag):
+        chain = [a]
+        for l in range(layer[a] + 1, layer[b]):
+            dummy = ("dummy", i, l)
+            layers[l].append(dummy)
+            up[dummy] = []
+            down[dummy] = []
+            chain.append(dummy)
+        chain.append(b)
+
+        for (u, v) in zip(chain, chain[1:]):
+            down[u].append(v)
+            up[v].append(u)
+        chains.append(chain)
+
+    _order(layers, up, down, sweeps)
+    x = _coordinates(layers, up, node_gap)
+    y = {n: layer[n] * layer_gap for n in nodes}
+    for chain in chains:
+        for dummy in chain[1:-1]:
+            y[dummy] = dummy[2] * layer_gap
+
+    placed = {}
+    above = {}
+    below = {}
+    for n in nodes:
+        elem = _place(x[n], y[n], shape, r, w, h)
+        placed[n] = elem
+        above[n] = _xy(elem.anchor(VDir.ABOVE))
+        below[n] = _xy(elem.anchor(VDir.BELOW))
+
+    routes = []
+    chains = iter(chains)
+    for (a, b) in edges:
+        if a == b:
+            routes.append(None)
+            continue
+
+        chain = next(chains)
+        if (a, b) in back:
+            # Edges that point up leave from the top and enter at the bottom
+            route = _route(above[a], chain[-2:0:-1], below[b], x, y)
+        else:
+            route = _route(below[a], chain[1:-1], above[b], x, y)
+        routes.append(route)
+
+    return (Layered(placed, _lines(routes, radius), layer), x, y, routes)
+
+def _xy(point):
+    v = point.position.as_vec()
+    return (v.x, v.y)
+
+def _same_x(a, b):
+    # The anchors come out of trig, so they are a rounding error off
+    return abs(a[0] - b[0]) < 1e-9
+
+def _route(start, dummies, end, x, y):
+    # The corners of an edge as (x, y), through the dummies in between.
+    # Straight vertical runs don't need any corners, and corners on a
+    # straight line are just wasted work for the renderer. Every other step
+    # goes vertical, horizontal, vertical, like common.path_vhv.
+    points = [start]
+    for dummy in dummies:
+        points.append((x[dummy], y[dummy]))
+    points.append(end)
+
+    route = [start]
+    for i, point in enumerate(points[1:], 1):
+        head = route[-1]
+        if _same_x(head, point):
+            if i + 1 < len(points) and _same_x(point, points[i + 1]):
+                continue
+            route.append(point)
+        else:
+            mid = (point[1] + head[1]) / 2
+            route.extend(((head[0], mid), (point[0], mid), point))
+    return route
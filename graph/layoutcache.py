@@ -0,0 +1,357 @@
+import atexit
+import collections
+import contextlib
+import enum
+import functools
+import hashlib
+import os
+import struct
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    # No locking, two processes saving at once can lose records of one of
+    # them
+    fcntl = None
+
+from vec import (
+    BACKEND,
+    Affine2,
+    Mat4,
+    Vec,
+    Vec2,
+    VecArray,
+)
+
+# Set to a path to have batch.py, and scripts that call use_from_env, use a
+# layout cache there
+ENV = "GRAPH_LAYOUT_CACHE"
+
+# The modules whose code decides the geometry that gets cached. Every key
+# includes a hash of their source, so changing any of them can't load
+# geometry the old code came up with.
+GEOMETRY_MODULES = [
+    "common", "layout", "layoutcache", "metrics", "node", "pointarray",
+    "route", "vec",
+]
+
+_MAGIC = b"GLC1"
+_KEY_SIZE = 16
+_RECORD = struct.Struct("<16sI")
+
+# The cache the bulk layouts use when they aren't given one, see
+# LayoutCache.activate
+_default = None
+
+
+class Uncachable(Exception):
+    pass
+
+def _pack_str(out, s):
+    b = s.encode("utf-8")
+    out.append(struct.pack("<I", len(b)))
+    out.append(b)
+
+def _pack_doubles(out, values):
+    out.append(struct.pack(f"<I{len(values)}d", len(values), *values))
+
+def _encode_value(value, out):
+    # The type goes first, so an int and a float that are equal stay apart,
+    # they format differently
+    if value is None:
+        out.append(b"N")
+    elif value is True:
+        out.append(b"T")
+    elif value is False:
+        out.append(b"F")
+    elif type(value) is int:
+        out.append(b"i")
+        out.append(struct.pack("<q", value))
+    elif type(value) is float:
+        out.append(b"f")
+        out.append(struct.pack("<d", value))
+    elif type(value) is str:
+        out.append(b"s")
+        _pack_str(out, value)
+    elif type(value) is Affine2:
+        out.append(b"A")
+        out.append(struct.pack("<6d", *value.planar()))
+    elif type(value) is Mat4:
+        out.append(b"M")
+        out.append(struct.pack("<16d", *value.values()))
+    elif type(value) is Vec or type(value) is Vec2:
+        out.append(b"V" if type(value) is Vec else b"W")
+        out.append(struct.pack("<3d", value.x, value.y, value.z))
+    elif type(value) is VecArray:
+        out.append(b"R")
+        _pack_doubles(out, value.values())
+    else:
+        raise Uncachable(type(value))
+
+def _encode_input(value, out):
+    # Everything a cached result can be computed from. The inputs are only
+    # ever hashed, so they don't need to be read back.
+    if type(value) is list or type(value) is tuple:
+        out.append(b"L" if type(value) is list else b"U")
+        out.append(struct.pack("<I", len(value)))
+        for v in value:
+            _encode_input(v, out)
+    elif isinstance(value, enum.Enum):
+        out.append(b"E")
+        _pack_str(out, f"{type(value).__qualname__}.{value.name}")
+    elif hasattr(value, "origin") and hasattr(value, "position"):
+        # A Point, or a view of one. Only what it is counts, not how it was
+        # derived.
+        out.append(b"P")
+        _encode_input(value.position, out)
+        _encode_input(value.halign, out)
+        _encode_input(value.valign, out)
+    elif hasattr(value, "transforms") and hasattr(value, "hcodes"):
+        # A PointArray
+        out.append(b"Y")
+        for array in (value.transforms, value.hcodes, value.vcodes):
+            out.append(struct.pack("<I", array.nbytes))
+            out.append(array.tobytes())
+    elif hasattr(value, "__dict__") and not callable(value):
+        # Plain value objects, like Color
+        out.append(b"O")
+        _pack_str(out, type(value).__qualname__)
+        for name, v in sorted(vars(value).items()):
+            _pack_str(out, name)
+            _encode_input(v, out)
+    else:
+        _encode_value(value, out)
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    digest = hashlib.blake2b(_MAGIC, digest_size=_KEY_SIZE)
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in GEOMETRY_MODULES:
+        with open(os.path.join(here, f"{name}.py"), "rb") as f:
+            digest.update(f.read())
+    return digest.digest()
+
+def key_of(name, *parts):
+    # The hash of everything some result is computed from, or None if some of
+    # it can't be hashed. The backend is part of it, since the two can round
+    # the last bits differently, and so is the code, see GEOMETRY_MODULES.
+    out = [code_version(), BACKEND.encode(), b"\0"]
+    _pack_str(out, name)
+    try:
+        _encode_input(parts, out)
+    except Uncachable:
+        return None
+    return hashlib.blake2b(b"".join(out), digest_size=_KEY_SIZE).digest()
+
+def pack_paths(paths):
+    # Lists of (x, y), or None, in one record
+    out = [struct.pack("<I", len(paths))]
+    for path in paths:
+        if path is None:
+            out.append(struct.pack("<i", -1))
+            continue
+        out.append(struct.pack("<i", len(path)))
+        out.append(struct.pack(f"<{len(path) * 2}d", *(c for xy in path for c in xy)))
+    return b"".join(out)
+
+def unpack_paths(data, at=0):
+    # Gives back the paths and where they ended
+    (n,) = struct.unpack_from("<I", data, at)
+    at += 4
+    paths = []
+    for _ in range(n):
+        (count,) = struct.unpack_from("<i", data, at)
+        at += 4
+        if count < 0:
+            paths.append(None)
+            continue
+        values = struct.unpack_from(f"<{count * 2}d", data, at)
+        at += count * 16
+        paths.append(list(zip(values[0::2], values[1::2])))
+    return (paths, at)
+
+class LayoutCache():
+    # Resolved geometry, kept on disk between runs. Results like a whole
+    # layered layout or a batch of routes go through get and put with a key
+    # from key_of. While it's active, layout.layered and route.Router use it
+    # when they aren't given a cache.
+    #
+    #     with LayoutCache(".layout") as cache:
+    #         ... build the diagram ...
+    #
+    # The file is a list of (key, length, data) records, least recently used
+    # first. When saving, the oldest records go until it fits in max_bytes.
+    # Processes sharing the file merge their records into it.
+    def __init__(self, path, max_bytes=8 << 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.records = collections.OrderedDict()
+        self.size = 0
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.prev = None
+        self.load()
+
+    def load(self):
+        self.records.clear()
+        self.size = 0
+        for (key, data) in self._read():
+            self._put(key, data)
+
+    def _read(self):
+        # The records in the file, oldest first
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+
+        # A cache that can't be read is as good as an empty one
+        if data[:len(_MAGIC)] != _MAGIC:
+            return []
+        records = []
+        at = len(_MAGIC)
+        try:
+            while at < len(data):
+                (key, n) = _RECORD.unpack_from(data, at)
+                at += _RECORD.size
+                if at + n > len(data):
+                    break
+                records.append((key, data[at:at + n]))
+                at += n
+        except struct.error:
+            pass
+        return records
+
+    def _put(self, key, data):
+        old = self.records.pop(key, None)
+        if old is not None:
+            self.size -= _RECORD.size + len(old)
+        self.records[key] = data
+        self.size += _RECORD.size + len(data)
+
+    def get(self, key):
+        # The record stored under the key, if any
+        data = self.records.get(key) if key is not None else None
+        if data is None:
+            self.misses += 1
+            return None
+
+        # Only in memory, a run that just reads doesn't write the file again
+        # for it
+        self.records.move_to_end(key)
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        if key is None:
+            return
+        self._put(key, data)
+        self.dirty = True
+
+    def evict(self):
+        while self.size > self.max_bytes and self.records:
+            (_, data) = self.records.popitem(last=False)
+            self.size -= _RECORD.size + len(data)
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        with self._locked():
+            # Other processes may have saved since this one loaded. Their
+            # records are kept, as older than any of ours.
+            records = self.records
+            self.records = collections.OrderedDict()
+            self.size = 0
+            for (key, data) in self._read():
+                if key not in records:
+                    self._put(key, data)
+            for (key, data) in records.items():
+                self._put(key, data)
+            self.evict()
+
+            out = [_MAGIC]
+            for key, data in self.records.items():
+                out.append(_RECORD.pack(key, len(data)))
+                out.append(data)
+
+            # Written next to it and moved over, so a crash never leaves half
+            # a cache behind
+            (fd, tmp) = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(self.path)),
+                prefix=f".{os.path.basename(self.path)}.", suffix=".tmp",
+            )
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(b"".join(out))
+                os.replace(tmp, self.path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+        self.dirty = False
+
+    @contextlib.contextmanager
+    def _locked(self):
+        # Saving is a read, merge and replace, which only one process may do
+        # at a time
+        if fcntl is None:
+            yield
+            return
+
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def activate(self):
+        global _default
+        self.prev = _default
+        _default = self
+
+    def deactivate(self):
+        global _default
+        _default = self.prev
+        self.save()
+
+    def __enter__(self):
+        self.activate()
+        return self
+
+    def __exit__(self, *exc):
+        self.deactivate()
+
+def default():
+    # The active cache, if any
+    return _default
+
+@contextlib.contextmanager
+def scoped():
+    # Puts back the cache that was active before, whatever was activated in
+    # between
+    global _default
+    prev = _default
+    try:
+        yield
+    finally:
+        _default = prev
+
+def use_from_env():
+    # For scripts. Uses the cache at the path in the environment, if there is
+    # one, for the rest of the run. A script run by something that already
+    # activated a cache, like batch.py, uses that one.
+    path = os.environ.get(ENV)
+    if not path:
+        return None
+    if _default is not None:
+        return _default
+
+    cache = LayoutCache(path)
+    cache.activate()
+    atexit.register(cache.deactivate)
+    return cache
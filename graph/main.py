@@ -24,6 +24,9 @@ from node import (
     Circle,
     Square,
 )
+from scene import (
+    Scene,
+)
 from vec import (
     Mat4,
 )
@@ -73,7 +76,7 @@ lb_l_label = node.Text("End it!", node.offset(lb_l.edge(1, 50), 2))
 
 ll = node.MultiLine(path(thing_box.anchor(HDir.RIGHT), other_box.anchor(HDir.LEFT)), 10)
 
-g = (
+scene = Scene((
     container,
     large_box,
     large_label,
@@ -90,15 +93,7 @@ g = (
     lb_l_label,
     ll,
     nodes,
-)
-
-bboxes = [x.bbox() for x in g]
-canvas.size_and_write_preamble(sys.stdout.write, bboxes)
-
-for elem in g:
-    elem.draw(sys.stdout.write)
-
-canvas.write_tail(sys.stdout.write)
-
-sys.stdout.flush()
+))
 
+with canvas.SvgWriter(sys.stdout) as out:
+    scene.draw(out)
@@ -0,0 +1,75 @@
+import functools
+
+# Advance widths of the printable ASCII glyphs, in 1/1000 em, starting at the
+# space (32). These are the widths from the Helvetica AFM, which Arial and most
+# default sans-serif fonts match closely.
+_HELVETICA_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+
+class FontMetrics():
+    def __init__(self, widths, first, default, ascent, descent):
+        self.widths = widths
+        self.first = first
+        # Used for everything not in the table
+        self.default = default
+        self.ascent = ascent
+        self.descent = descent
+
+    def advance(self, char):
+        i = ord(char) - self.first
+        if 0 <= i < len(self.widths):
+            return self.widths[i]
+        return self.default
+
+HELVETICA = FontMetrics(_HELVETICA_WIDTHS, 32, 556, 718, 207)
+
+FONTS = {
+    "Helvetica": HELVETICA,
+    "Arial": HELVETICA,
+    "sans-serif": HELVETICA,
+}
+
+# What svg renderers tend to use when a text doesn't say
+DEFAULT_FONT = "sans-serif"
+DEFAULT_SIZE = 16
+
+
+def font_metrics(font):
+    # Fonts we don't know are measured like the default one. It's an estimate
+    # either way.
+    return FONTS.get(font, FONTS[DEFAULT_FONT])
+
+@functools.lru_cache(maxsize=4096)
+def measure(text, font=DEFAULT_FONT, size=DEFAULT_SIZE):
+    # The (width, ascent, descent) of a string, in user units. No kerning.
+    metrics = font_metrics(font)
+    width = sum(metrics.advance(c) for c in text) * size / 1000
+    return (width, metrics.ascent * size / 1000, metrics.descent * size / 1000)
+
+def text_box(text, anchor, baseline, font=DEFAULT_FONT, size=DEFAULT_SIZE):
+    # The box around a string relative to the point it's drawn at, as
+    # (x, y, w, h), for the svg text-anchor and dominant-baseline given
+    (width, ascent, descent) = measure(text, font, size)
+    height = ascent + descent
+
+    if anchor == "start":
+        x = 0
+    elif anchor == "end":
+        x = -width
+    else:
+        x = -width/2
+
+    if baseline == "hanging":
+        y = 0
+    elif baseline in ("alphabet", "alphabetic"):
+        y = -ascent
+    else:
+        y = -height/2
+
+    return (x, y, width, height)
@@ -1,6 +1,13 @@
+import bisect
+import functools
 import math
 
 import canvas
+import metrics
+from bounds import (
+    Bounds,
+    of_elements,
+)
 from common import (
     HDir,
     Point,
@@ -8,16 +15,28 @@ from common import (
     p,
     v2p,
 )
+from reactive import (
+    anchored,
+    derived,
+    tracked,
+)
 from vec import (
-    Mat4,
+    BACKEND,
+    Affine2,
     Vec2,
+    VecArray,
 )
 
+if BACKEND == "numpy":
+    import numpy as np
+else:
+    np = None
+
 
 def fit(nodes, pad):
-    (min, size) = canvas.size([x.bbox() for x in nodes])
+    (min, size) = of_elements(nodes).size()
     size += pad*2
-    return (v2p(min * Mat4.translate(-pad, -pad), HDir.RIGHT, VDir.BELOW), size.x, size.y)
+    return (v2p(min * Affine2.translate(-pad, -pad), HDir.RIGHT, VDir.BELOW), size.x, size.y)
 
 class Color():
     def __init__(self, r, g, b, a = 1):
@@ -74,10 +93,17 @@ def square_edge(width, height, theta):
             continue
 
         cross = line_intersect_point(*edge, t)
-        return v2p(Mat4.translate(cross.x, cross.y), halign=align, valign=valign)
+        return v2p(Affine2.translate(cross.x, cross.y), halign=align, valign=valign)
 
     raise TypeError
 
+# The anchors of shapes are calculated in the shape's own coordinates, and
+# the same few sizes and directions tend to get asked for over and over, so
+# those are kept in a bounded cache. The cached points are shared, so they must
+# never be changed in place.
+ANCHOR_CACHE_SIZE = 4096
+
+@functools.lru_cache(maxsize=ANCHOR_CACHE_SIZE)
 def square_anchor(width, height, *args):
     if args == (HDir.RIGHT,) or args == (VDir.MIDDLE, HDir.RIGHT):
         return square_edge(width, height, 0)
@@ -103,8 +129,41 @@ def square_anchor(width, height, *args):
 
     raise TypeError
 
+@functools.lru_cache(maxsize=ANCHOR_CACHE_SIZE)
+def circle_edge(r, theta):
+    theta = abs(theta) % (math.pi * 2)
+    ray = Vec2(math.cos(theta), -math.sin(theta))
+    theta /= math.pi
+
+    if theta <= 0.375 or theta >= 1.625:
+        align = HDir.RIGHT
+    elif theta >= 0.625 and theta <= 1.375:
+        align = HDir.LEFT
+    else:
+        align = HDir.MIDDLE
+
+    if theta >= 0.125 and theta <= 0.875:
+        valign = VDir.BELOW
+    elif theta >= 1.125 and theta <= 1.875:
+        valign = VDir.ABOVE
+    else:
+        valign = VDir.MIDDLE
+
+    return v2p(Affine2.translate(ray.x * r, ray.y * r), halign=align, valign=valign)
+
+def anchor_cache_info():
+    # Hit and miss counts for the anchor caches, for tuning ANCHOR_CACHE_SIZE
+    return {
+        "square": square_anchor.cache_info(),
+        "circle": circle_edge.cache_info(),
+    }
+
+def anchor_cache_clear():
+    square_anchor.cache_clear()
+    circle_edge.cache_clear()
+
 def square_extents(width, height):
-    return Mat4.translate(width, height)
+    return Affine2.translate(width, height)
 
 def square_write(write, width, height, position, fill, fill_opacity, stroke, stroke_width):
     write(f"<path d=\"")
@@ -145,12 +204,16 @@ def square_position_point(point, width, height):
     else:
         raise NotImplementedError
 
-    return point.position * Mat4.translate(-xoff, -yoff)
+    return point.position * Affine2.translate(-xoff, -yoff)
 
 def center(shape):
     return shape.anchor(VDir.MIDDLE, HDir.MIDDLE)
 
 class Square():
+    # Lets bounds.of_elements batch these, see bounds()
+    shape = "rect"
+
+    @tracked
     def __init__(self, pos, w, h, fill=Color(255, 255, 255), stroke="black", stroke_width=1):
         self.pos = square_position_point(pos, w, h)
         self.w = w
@@ -163,9 +226,14 @@ class Square():
     def bbox(self):
         return (self.pos, (self.w, self.h))
 
+    def bounds(self):
+        return Bounds.rect(self.pos, self.w, self.h)
+
+    @anchored
     def center(self):
-        return v2p(self.pos * Mat4.translate(self.w/2, self.h/2), halign=HDir.MIDDLE, valign=VDir.MIDDLE)
+        return v2p(self.pos * Affine2.translate(self.w/2, self.h/2), halign=HDir.MIDDLE, valign=VDir.MIDDLE)
 
+    @anchored
     def anchor(self, *args):
         point = square_anchor(self.w, self.h, *args)
         if point is None:
@@ -174,6 +242,7 @@ class Square():
         pos = (self.pos * point.position)
         return v2p(pos, point.halign, point.valign)
 
+    @anchored
     def edge(self, theta):
         point = square_edge(self.w, self.h, theta)
         if point is None:
@@ -185,6 +254,9 @@ class Square():
         square_write(write, self.w, self.h, self.pos, self.fill, self.fill_opacity, self.stroke, self.stroke_width)
 
 class Circle():
+    shape = "circle"
+
+    @tracked
     def __init__(self, pos, r, fill=None, stroke="black", stroke_width=1):
         self.pos = pos.position
         self.r = r
@@ -205,14 +277,20 @@ class Circle():
         elif pos.valign == VDir.ABOVE:
             yoff = -r
 
-        self.pos *= Mat4.translate(-xoff, -yoff)
+        self.pos *= Affine2.translate(-xoff, -yoff)
 
     def bbox(self):
-        return (self.pos * Mat4.translate(-self.r, -self.r), (self.r*2, self.r*2))
+        return (self.pos * Affine2.translate(-self.r, -self.r), (self.r*2, self.r*2))
+
+    def bounds(self):
+        # Exact under rotation, where the corners of the bbox stick out
+        return Bounds.circle(self.pos, self.r)
 
+    @anchored
     def center(self):
         return v2p(self.pos, halign=HDir.MIDDLE, valign=VDir.MIDDLE)
 
+    @anchored
     def anchor(self, *args):
         if len(args) > 2:
             raise NotImplementedError
@@ -247,31 +325,15 @@ class Circle():
 
         raise TypeError
 
+    @anchored
     def edge(self, theta):
-        theta = abs(theta) % (math.pi * 2)
-        ray = Vec2(math.cos(theta), -math.sin(theta))
-        theta /= math.pi
-
-        if theta <= 0.375 or theta >= 1.625:
-            align = HDir.RIGHT
-        elif theta >= 0.625 and theta <= 1.375:
-            align = HDir.LEFT
-        else:
-            align = HDir.MIDDLE
-
-        if theta >= 0.125 and theta <= 0.875:
-            valign = VDir.BELOW
-        elif theta >= 1.125 and theta <= 1.875:
-            valign = VDir.ABOVE
-        else:
-            valign = VDir.MIDDLE
-
-        mat = Mat4.translate(ray.x * self.r, ray.y * self.r)
-        return v2p(self.pos * mat, halign=align, valign=valign)
+        point = circle_edge(self.r, theta)
+        return v2p(self.pos * point.position, halign=point.halign, valign=point.valign)
 
     def draw(self, write):
         write(f"<circle r=\"{self.r}\" fill=\"{self.fill}\" fill-opacity=\"{self.fill_opacity}\" stroke=\"{self.stroke}\" stroke-width=\"{self.stroke_width}\" {transform_str(self.pos)} />\n")
 
+@derived
 def grid_offset(point, hdist=100, vdist=100):
     hdir = point.halign
     vdir = point.valign
@@ -281,11 +343,12 @@ def grid_offset(point, hdist=100, vdist=100):
         point.valign,
     )
 
+@derived
 def offset(point, dist=100):
     hdir = point.halign
     vdir = point.valign
 
-    offset = Mat4.translate(hdir.direction() * dist, vdir.direction() * dist)
+    offset = Affine2.translate(hdir.direction() * dist, vdir.direction() * dist)
 
     return Point(
         point.position * offset,
@@ -293,22 +356,58 @@ def offset(point, dist=100):
         point.valign,
     )
 
+ARROWHEAD = (
+    "<marker id=\"arrowhead\" markerWidth=\"10\" markerHeight=\"7\" refX=\"0\" refY=\"3.5\" orient=\"auto\">\n"
+    "<polygon points=\"0 0, 10 3.5, 0 7\" />\n"
+    "</marker>\n"
+)
+
+def _tangent_alignment(theta):
+    # Which way to align something placed on a line going in the direction
+    part = round((theta / math.tau) * 8)
+    return [
+        (HDir.MIDDLE, VDir.BELOW),
+        (HDir.RIGHT, VDir.BELOW),
+        (HDir.RIGHT, VDir.MIDDLE),
+        (HDir.LEFT, VDir.BELOW),
+        (HDir.MIDDLE, VDir.BELOW),
+        (HDir.RIGHT, VDir.BELOW),
+        (HDir.RIGHT, VDir.MIDDLE),
+        (HDir.LEFT, VDir.BELOW),
+    ][part]
+
+# The chords every rounded corner is measured with in the arc length table
+CORNER_STEPS = 8
+
+def _quad(p0, c, p1, t):
+    u = 1 - t
+    return p0 * (u * u) + c * (2 * u * t) + p1 * (t * t)
+
+def _quad_tangent(p0, c, p1, t):
+    return (c - p0) * (2 * (1 - t)) + (p1 - c) * (2 * t)
+
 class MultiLine():
+    @tracked
     def __init__(self, points, radius=5, stroke="black", stroke_width=1):
-        self.points = [p.position.as_vec() for p in points]
+        if hasattr(points, "positions"):
+            # A PointArray, which has them all at hand already
+            self.points = points.positions()
+        else:
+            self.points = VecArray.from_vecs(p.position.as_vec() for p in points)
         self.radius = radius
         self.stroke = stroke
         self.stroke_width = stroke_width
+        # Built on the first query along the path, see _arc_table
+        self._arc = None
 
     def bbox(self):
-        xs = [p.x for p in self.points]
-        ys = [p.y for p in self.points]
-        x = min(xs)
-        y = min(ys)
-        w = max(xs) - x
-        h = max(ys) - y
-        return (Mat4.translate(x, y), (w, h))
+        (x0, y0, x1, y1) = self.points.extents()
+        return (Affine2.translate(x0, y0), (x1 - x0, y1 - y0))
 
+    def bounds(self):
+        return Bounds(*self.points.extents())
+
+    @anchored
     def edge(self, segment, t):
         assert segment >= 0
         assert segment < len(self.points)
@@ -326,29 +425,112 @@ class MultiLine():
         # and using that to control the position. In most cases though, the
         # radius will be so small, so it shouldn't really matter much.
 
-        theta = line.angle()
-        part = round((theta / math.tau) * 8)
-        (hdir, vdir) = [
-            (HDir.MIDDLE, VDir.BELOW),
-            (HDir.RIGHT, VDir.BELOW),
-            (HDir.RIGHT, VDir.MIDDLE),
-            (HDir.LEFT, VDir.BELOW),
-            (HDir.MIDDLE, VDir.BELOW),
-            (HDir.RIGHT, VDir.BELOW),
-            (HDir.RIGHT, VDir.MIDDLE),
-            (HDir.LEFT, VDir.BELOW),
-        ][part]
+        (hdir, vdir) = _tangent_alignment(line.angle())
 
         vec = start + line.unit() * intended_len
-        mat = Mat4.translate(vec.x, vec.y)
+        mat = Affine2.translate(vec.x, vec.y)
         return v2p(mat, halign=hdir, valign=vdir)
 
+    def _corner_points(self):
+        # (start, control, end) of every rounded corner, as Vecs
+        corners = self.corners()
+        if corners is not None:
+            return [
+                (Vec2(*begin), Vec2(*control), Vec2(*end))
+                for (begin, control, end) in zip(*corners)
+            ]
+
+        out = []
+        if self.radius > 0:
+            for i in range(1, len(self.points) - 1):
+                current = self.points[i]
+                (begin, end) = _round_corner(self.points[i - 1], current, self.points[i + 1], self.radius)
+                out.append((begin, current, end))
+        return out
+
+    def _arc_table(self):
+        # The path as drawn, cut into pieces, with the length along the path
+        # where each one starts. Every piece is a quadratic curve and a range
+        # of its parameter: the straight parts are curves with the control
+        # point in the middle, which are exactly straight, and every rounded
+        # corner is cut into CORNER_STEPS pieces measured by their chords.
+        if self._arc is not None:
+            return self._arc
+
+        pieces = []
+        def line(a, b):
+            pieces.append((a, (a + b) * 0.5, b, 0.0, 1.0, (b - a).length()))
+
+        head = self.points[0]
+        if self.radius <= 0:
+            # No corners to round, the path goes straight through every point
+            for i in range(1, len(self.points) - 1):
+                line(head, self.points[i])
+                head = self.points[i]
+        for (begin, control, end) in self._corner_points():
+            line(head, begin)
+            prev = begin
+            for k in range(1, CORNER_STEPS + 1):
+                t = k / CORNER_STEPS
+                point = _quad(begin, control, end, t)
+                pieces.append((begin, control, end, (k - 1) / CORNER_STEPS, t, (point - prev).length()))
+                prev = point
+            head = end
+        if len(self.points) > 1:
+            line(head, self.points[len(self.points) - 1])
+
+        starts = []
+        total = 0.0
+        for piece in pieces:
+            starts.append(total)
+            total += piece[5]
+
+        self._arc = (starts, pieces, total)
+        return self._arc
+
+    def length(self):
+        # The length of the path as drawn, corners included
+        return self._arc_table()[2]
+
+    def at_length(self, dist):
+        # The position along the path, dist from the start, and the unit
+        # tangent there. Found by binary search, so any number of labels can
+        # be placed along a line without walking it every time.
+        (starts, pieces, total) = self._arc_table()
+        if not pieces:
+            return (self.points[0], Vec2(0, 0))
+
+        dist = min(max(dist, 0.0), total)
+        i = max(bisect.bisect_right(starts, dist) - 1, 0)
+        (p0, c, p1, t0, t1, length) = pieces[i]
+        # Zero length pieces are only ever the last one found at their start
+        frac = (dist - starts[i]) / length if length else 0.0
+        t = t0 + (t1 - t0) * frac
+        return (_quad(p0, c, p1, t), _quad_tangent(p0, c, p1, t).unit())
+
+    @anchored
+    def along(self, fraction):
+        # The point a fraction of the way along the path, aligned like edge
+        (pos, tangent) = self.at_length(fraction * self.length())
+        (hdir, vdir) = _tangent_alignment(tangent.angle())
+        return v2p(Affine2.translate(pos.x, pos.y), halign=hdir, valign=vdir)
+
     def draw(self, write):
-        write("<defs>\n")
-        write("<marker id=\"arrowhead\" markerWidth=\"10\" markerHeight=\"7\" refX=\"0\" refY=\"3.5\" orient=\"auto\">\n")
-        write("<polygon points=\"0 0, 10 3.5, 0 7\" />\n")
-        write("</marker>\n")
-        write("</defs>\n")
+        canvas.define(write, "arrowhead", ARROWHEAD)
+        self._write_path(write, self.corners())
+
+    def corners(self):
+        # The start, control and end points of the curve at every inner
+        # point, as three arrays, or None when they have to be worked out one
+        # by one
+        if np is None or self.radius <= 0 or len(self.points) < 3:
+            return None
+
+        inner = self.points.inner
+        radii = np.full(len(inner) - 2, self.radius, dtype=np.double)
+        return _round_corners(inner[:-2], inner[1:-1], inner[2:], radii)
+
+    def _write_path(self, write, corners):
         head_length = 10
 
         cursor = 0
@@ -358,7 +540,14 @@ class MultiLine():
         write(f"<path d=\"")
         write(f"M {current.x} {current.y} ")
 
-        if self.radius > 0:
+        if corners is not None:
+            (begins, controls, ends) = corners
+            for (bx, by, _), (cx, cy, _), (ex, ey, _) in zip(begins, controls, ends):
+                write(f"L {bx} {by} ")
+                write(f"Q {cx} {cy} {ex} {ey} ")
+            cursor = len(self.points) - 1
+            current = self.points[cursor - 1]
+        elif self.radius > 0:
             while cursor + 1 < len(self.points):
                 # Get the current point and the 2 surrounding points
                 last = current
@@ -366,29 +555,7 @@ class MultiLine():
                 cursor += 1
                 next_ = self.points[cursor]
 
-                # Find the relative vectors from the current point to the
-                # surrounders
-                last -= current
-                next_ -= current
-
-                # Find the angle of the tangent. Since the curve is symmetrical,
-                # it's the same for both
-                # Start by finding the angle between the 3 points
-                dot = next_.dot(last)
-                angle = math.acos(dot / (next_.length() * last.length()))
-                # The angle relative to the circle is then the complementary of
-                # that
-                angle = math.pi - angle
-                angle /= 2
-
-                # Now we just have to multiply the unit vector towards each
-                # surrounder with the length of the tangent to find the curve start
-                # and end
-                unit_last = last.unit()
-                unit_next = next_.unit()
-                tanl = math.tan(angle) * self.radius
-                beginround = current + unit_last * tanl
-                endround = current + unit_next * tanl
+                (beginround, endround) = _round_corner(last, current, next_, self.radius)
 
                 write(f"L {beginround.x} {beginround.y} ")
                 write(f"Q {current.x} {current.y} {endround.x} {endround.y} ")
@@ -412,6 +579,129 @@ class MultiLine():
         write(f"marker-end=\"url(#arrowhead)\"\n")
         write(" />")
 
+# tan(pi / 2), what a line that doubles back on itself got from the trig
+# version of _corner_tangent
+_TAN_REVERSED = math.tan(math.pi / 2)
+
+def _corner_tangent(cos):
+    if not -1 <= cos <= 1:
+        raise ValueError("math domain error")
+    if cos == 1:
+        return _TAN_REVERSED
+    return math.sqrt((1 + cos) / (1 - cos))
+
+def _round_corner(last, current, next_, radius):
+    # Where the curve around current starts and ends, between the points on
+    # either side of it
+
+    # Find the relative vectors from the current point to the
+    # surrounders
+    last -= current
+    next_ -= current
+
+    # The tangent from current to where the curve starts is radius times
+    # tan((pi - angle) / 2), with angle the one between the 3 points. That's
+    # sqrt((1 + cos) / (1 - cos)) of the same angle, which needs no trig and
+    # is the same for _round_corners, which does it for many corners at once.
+    cos = next_.dot(last) / (next_.length() * last.length())
+    tanl = _corner_tangent(cos) * radius
+
+    # Now we just have to multiply the unit vector towards each
+    # surrounder with the length of the tangent to find the curve start
+    # and end
+    unit_last = last.unit()
+    unit_next = next_.unit()
+    beginround = current + unit_last * tanl
+    endround = current + unit_next * tanl
+    return (beginround, endround)
+
+def _round_corners(last, current, next_, radii):
+    # The corner rounding of MultiLine.draw for many corners at once, given as
+    # the rows of (N, 3) arrays. Every step is the same operation in the same
+    # order as _round_corner, and takes only arithmetic and sqrt, which numpy
+    # rounds the same as math, so the results are the same to the bit. Gives
+    # lists of (x, y, z) for the start, control and end points, or None if
+    # some corner is degenerate, in which case the scalar version raises the
+    # error.
+    last = last - current
+    next_ = next_ - current
+
+    (lx, ly, lz) = last.T
+    (nx, ny, nz) = next_.T
+    last_len = np.sqrt(lx * lx + ly * ly + lz * lz)
+    next_len = np.sqrt(nx * nx + ny * ny + nz * nz)
+    lengths = next_len * last_len
+    if not lengths.all():
+        return None
+
+    cos = (nx * lx + ny * ly + nz * lz) / lengths
+    if (np.abs(cos) > 1).any():
+        return None
+
+    with np.errstate(divide="ignore"):
+        tangent = np.sqrt((1 + cos) / (1 - cos))
+    tanl = np.where(cos == 1, _TAN_REVERSED, tangent) * radii
+
+    begins = current + last / last_len[:, np.newaxis] * tanl[:, np.newaxis]
+    ends = current + next_ / next_len[:, np.newaxis] * tanl[:, np.newaxis]
+    return (begins.tolist(), current.tolist(), ends.tolist())
+
+def draw_lines(write, lines):
+    # Draw many MultiLines, with the corners of all of them rounded in one
+    # pass. The output is the same as drawing them one by one.
+    lines = list(lines)
+    if np is None:
+        for line in lines:
+            line.draw(write)
+        return
+
+    batched = [line for line in lines if line.radius > 0 and len(line.points) >= 3]
+    corners = {}
+    if batched:
+        # Every corner is a row, along with the points on either side of it
+        last = np.concatenate([line.points.inner[:-2] for line in batched])
+        current = np.concatenate([line.points.inner[1:-1] for line in batched])
+        next_ = np.concatenate([line.points.inner[2:] for line in batched])
+        radii = np.concatenate([np.full(len(line.points) - 2, line.radius, dtype=np.double) for line in batched])
+        rounded = _round_corners(last, current, next_, radii)
+
+        start = 0
+        for line in batched:
+            stop = start + len(line.points) - 2
+            if rounded is not None:
+                corners[id(line)] = tuple(part[start:stop] for part in rounded)
+            else:
+                # Find out which line it was
+                corners[id(line)] = line.corners()
+            start = stop
+
+    for line in lines:
+        canvas.define(write, "arrowhead", ARROWHEAD)
+        line._write_path(write, corners.get(id(line)))
+
+def _draw_run(write, run):
+    if len(run) == 1:
+        run[0].draw(write)
+    else:
+        draw_lines(write, run)
+
+def draw_elements(write, elements):
+    # Draw the elements in order, with every run of MultiLines going through
+    # draw_lines
+    run = []
+    for elem in elements:
+        if type(elem) is MultiLine:
+            run.append(elem)
+            continue
+
+        if run:
+            _draw_run(write, run)
+            run = []
+        elem.draw(write)
+
+    if run:
+        _draw_run(write, run)
+
 def _align_to_str(align):
     if align is None:
         return "middle"
@@ -430,11 +720,16 @@ def transform_str(transform):
     if transform is None:
         return ""
 
-    m = transform.inner
-    return f"transform=\"matrix({m[0, 0]} {m[1, 0]} {m[0, 1]} {m[1, 1]} {m[0, 3]} {m[1, 3]})\""
+    if isinstance(transform, Affine2):
+        t = transform
+        return f"transform=\"matrix({t.a} {t.b} {t.c} {t.d} {t.e} {t.f})\""
+
+    (a, b, c, d, e, f) = transform.planar()
+    return f"transform=\"matrix({a} {b} {c} {d} {e} {f})\""
 
 class Text():
-    def __init__(self, text, pos, fill="black", transform = Mat4.identity()):
+    @tracked
+    def __init__(self, text, pos, fill="black", transform = Affine2.identity(), font=None, size=None):
         self.pos = pos.position
         self.text = text
         self.fill = fill
@@ -442,10 +737,25 @@ class Text():
         self.valign = _align_to_str(pos.valign)
 
         self.transform = transform
+        # Left to the renderer when not given, and measured as its defaults
+        self.font = font
+        self.size = size
 
     def bbox(self):
-        # @INCOMPLETE
-        return (self.pos, (1, 1))
+        (x, y, w, h) = metrics.text_box(
+            self.text, self.align, self.valign,
+            self.font or metrics.DEFAULT_FONT, self.size or metrics.DEFAULT_SIZE,
+        )
+        return (self.pos * Affine2.translate(x, y), (w, h))
+
+    def bounds(self):
+        (pos, (w, h)) = self.bbox()
+        return Bounds.rect(pos, w, h)
 
     def draw(self, write):
-        write(f"<text fill=\"{self.fill}\" dominant-baseline=\"{self.valign}\" style=\"text-anchor: {self.align};\" {transform_str(self.pos)} >{self.text}</text>\n")
+        font = ""
+        if self.font is not None:
+            font += f"font-family=\"{self.font}\" "
+        if self.size is not None:
+            font += f"font-size=\"{self.size}\" "
+        write(f"<text fill=\"{self.fill}\" {font}dominant-baseline=\"{self.valign}\" style=\"text-anchor: {self.align};\" {transform_str(self.pos)} >{self.text}</text>\n")
@@ -0,0 +1,97 @@
+import concurrent.futures
+import multiprocessing
+import os
+
+import canvas
+import node
+
+# Elements in a chunk, small enough to keep every worker busy until the end
+CHUNK_SIZE = 2000
+
+# The elements being rendered, in a worker process. They're handed over once
+# when the pool starts, so the tasks themselves are just index ranges.
+_elements = None
+
+
+class FragmentWriter():
+    # Stands in for the document writer while rendering a chunk of elements
+    # somewhere else. The output is a list of strings and (id, markup) pairs,
+    # one for every definition an element asked for. Only the document knows
+    # which definitions it already has, so the pairs are left in place to be
+    # sorted out when the fragments are put together, in order.
+    def __init__(self):
+        self.parts = []
+        self.strings = []
+        # Acts as its own Defs, see canvas.define
+        self.defs = self
+
+    def write(self, s):
+        self.strings.append(s)
+
+    __call__ = write
+
+    def require(self, write, id, markup):
+        self._cut()
+        self.parts.append((id, markup))
+
+    def _cut(self):
+        if self.strings:
+            self.parts.append("".join(self.strings))
+            self.strings = []
+
+    def fragment(self):
+        self._cut()
+        return self.parts
+
+def render_fragment(elements):
+    out = FragmentWriter()
+    node.draw_elements(out, elements)
+    return out.fragment()
+
+def write_fragment(write, fragment):
+    for part in fragment:
+        if type(part) is str:
+            write(part)
+        else:
+            canvas.define(write, *part)
+
+def _init(elements):
+    global _elements
+    _elements = elements
+
+def _render_range(start, stop):
+    return render_fragment(_elements[start:stop])
+
+def _context():
+    # Forked workers get the elements without pickling them
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+def draw_elements(write, elements, workers=None, chunk_size=CHUNK_SIZE, threads=False):
+    # Draw the elements like calling draw on each of them in turn would, with
+    # the same output byte for byte, but with the formatting done in a pool of
+    # processes (or threads) a chunk at a time. workers defaults to the number
+    # of cpus.
+    elements = list(elements)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1 or len(elements) <= chunk_size:
+        node.draw_elements(write, elements)
+        return
+
+    ranges = [(i, min(i + chunk_size, len(elements))) for i in range(0, len(elements), chunk_size)]
+    if threads:
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            fragments = pool.map(lambda r: render_fragment(elements[r[0]:r[1]]), ranges)
+            for fragment in fragments:
+                write_fragment(write, fragment)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(
+        workers, mp_context=_context(), initializer=_init, initargs=(elements,),
+    ) as pool:
+        (starts, stops) = zip(*ranges)
+        for fragment in pool.map(_render_range, starts, stops):
+            write_fragment(write, fragment)
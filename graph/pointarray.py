@@ -0,0 +1,170 @@
+import numpy as np
+
+from common import (
+    ALIGNMENTS,
+    HDir,
+    Point,
+    VDir,
+)
+from vec import (
+    BACKEND,
+    Affine2,
+    Vec,
+    Vec2,
+    VecArray,
+)
+
+# The alignments are stored as small integer codes, chosen so that the code
+# minus one is the direction() of the enum
+_HDIRS = (HDir.LEFT, HDir.MIDDLE, HDir.RIGHT)
+_VDIRS = (VDir.ABOVE, VDir.MIDDLE, VDir.BELOW)
+_HCODE = {HDir.LEFT: 0, HDir.MIDDLE: 1, HDir.RIGHT: 2, None: 1}
+_VCODE = {VDir.ABOVE: 0, VDir.MIDDLE: 1, VDir.BELOW: 2, None: 1}
+
+# The unit direction for every pair of codes
+_DIRECTIONS = np.array([
+    [
+        (ALIGNMENTS[(h, v)][0].x, ALIGNMENTS[(h, v)][0].y)
+        for v in _VDIRS
+    ]
+    for h in _HDIRS
+], dtype=np.double)
+
+
+def _codes(halign, valign):
+    # The alignment a Point would end up with, in code form
+    (_, halign, valign) = ALIGNMENTS[(halign, valign)]
+    return (_HCODE[halign], _VCODE[valign])
+
+class PointArray():
+    # Many points in contiguous arrays. They are numpy arrays whatever the
+    # backend, so this is the one module that always needs numpy. The
+    # positions are the six planar coefficients (see Affine2.planar) of each
+    # point's transform, and the alignment of each point is kept as a code,
+    # so it never has to be worked out from the direction again.
+    __slots__ = ["transforms", "hcodes", "vcodes"]
+
+    def __init__(self, transforms, hcodes, vcodes):
+        self.transforms = transforms
+        self.hcodes = hcodes
+        self.vcodes = vcodes
+
+    @staticmethod
+    def from_points(points):
+        points = list(points)
+        transforms = np.array([_planar(p.position) for p in points], dtype=np.double).reshape(-1, 6)
+        hcodes = np.array([_HCODE[p.halign] for p in points], dtype=np.int8)
+        vcodes = np.array([_VCODE[p.valign] for p in points], dtype=np.int8)
+        return PointArray(transforms, hcodes, vcodes)
+
+    @staticmethod
+    def at(xs, ys, halign=None, valign=None):
+        # The bulk version of common.p
+        xs = np.asarray(xs, dtype=np.double)
+        ys = np.broadcast_to(np.asarray(ys, dtype=np.double), xs.shape)
+        n = len(xs)
+
+        transforms = np.zeros((n, 6), dtype=np.double)
+        transforms[:, 0] = 1
+        transforms[:, 3] = 1
+        transforms[:, 4] = xs
+        transforms[:, 5] = ys
+
+        (hcode, vcode) = _codes(halign, valign)
+        return PointArray(
+            transforms,
+            np.full(n, hcode, dtype=np.int8),
+            np.full(n, vcode, dtype=np.int8),
+        )
+
+    def __len__(self):
+        return len(self.transforms)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return PointArray(self.transforms[key], self.hcodes[key], self.vcodes[key])
+
+        if key < 0:
+            key += len(self)
+        return PointView(self, key)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield PointView(self, i)
+
+    @property
+    def directions(self):
+        return _DIRECTIONS[self.hcodes, self.vcodes]
+
+    def positions(self):
+        # The origin of every point, like Point.position.as_vec()
+        if BACKEND != "numpy":
+            return VecArray([(x, y, 0.0) for (x, y) in self.transforms[:, 4:6].tolist()])
+
+        return VecArray(np.column_stack((
+            self.transforms[:, 4],
+            self.transforms[:, 5],
+            np.zeros(len(self)),
+        )))
+
+    def points(self):
+        return [view.point() for view in self]
+
+    def adjust(self, dx, dy):
+        # The bulk version of common.adjust, dx and dy can be arrays
+        (a, b, c, d, e, f) = self.transforms.T
+        transforms = self.transforms.copy()
+        transforms[:, 4] = a * dx + c * dy + e
+        transforms[:, 5] = b * dx + d * dy + f
+        return PointArray(transforms, self.hcodes, self.vcodes)
+
+    def offset(self, dist=100):
+        # The bulk version of node.offset
+        return self.adjust((self.hcodes - 1) * dist, (self.vcodes - 1) * dist)
+
+    def realign(self, halign=None, valign=None):
+        hcodes = self.hcodes
+        vcodes = self.vcodes
+        if halign is not None:
+            hcodes = np.full(len(self), _HCODE[halign], dtype=np.int8)
+        if valign is not None:
+            vcodes = np.full(len(self), _VCODE[valign], dtype=np.int8)
+        return PointArray(self.transforms, hcodes, vcodes)
+
+class PointView():
+    # A single point of a PointArray. It can be used wherever a Point is read,
+    # and only builds the objects it's asked for.
+    __slots__ = ["array", "i"]
+
+    # Views are never tracked by reactive, they are plain values
+    origin = None
+
+    def __init__(self, array, i):
+        self.array = array
+        self.i = i
+
+    @property
+    def position(self):
+        return Affine2(*self.array.transforms[self.i])
+
+    @property
+    def direction(self):
+        (x, y) = _DIRECTIONS[self.array.hcodes[self.i], self.array.vcodes[self.i]]
+        return Vec2(x, y)
+
+    @property
+    def halign(self):
+        return _HDIRS[self.array.hcodes[self.i]]
+
+    @property
+    def valign(self):
+        return _VDIRS[self.array.vcodes[self.i]]
+
+    def point(self):
+        return Point(self.position, self.halign, self.valign)
+
+def _planar(position):
+    if isinstance(position, Vec):
+        # Some anchors are bare vectors, those are just an offset
+        return (1.0, 0.0, 0.0, 1.0, position.x, position.y)
+    return position.planar()
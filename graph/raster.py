@@ -0,0 +1,321 @@
+import functools
+import math
+import re
+import struct
+import zlib
+
+import numpy as np
+
+from bounds import of_elements
+from node import (
+    Circle,
+    MultiLine,
+    Square,
+)
+
+# Sub-rows per pixel row. Coverage along a row is exact, this is the
+# anti-aliasing across rows.
+SUBROWS = 4
+
+# Circles are drawn as polygons with a side for about every CIRCLE_STEP
+# pixels around, within these
+CIRCLE_STEP = 2
+CIRCLE_SIDES = (8, 64)
+
+# Strokes thinner than this many pixels are drawn at it, so the lines of a
+# large diagram don't vanish from its thumbnail
+MIN_STROKE = 0.5
+
+_NAMED = {
+    "black": (0, 0, 0),
+    "white": (255, 255, 255),
+    "red": (255, 0, 0),
+    "green": (0, 128, 0),
+    "blue": (0, 0, 255),
+    "gray": (128, 128, 128),
+    "grey": (128, 128, 128),
+}
+
+_RGB = re.compile(r"rgb\(\s*([-\d.]+)\s*,\s*([-\d.]+)\s*,\s*([-\d.]+)\s*\)")
+
+
+@functools.lru_cache(maxsize=None)
+def parse_color(color):
+    # The svg colors the elements use, as (r, g, b), or None for none
+    if color is None or color == "none":
+        return None
+    if color in _NAMED:
+        return _NAMED[color]
+
+    m = _RGB.fullmatch(color)
+    if m is not None:
+        return tuple(float(c) for c in m.groups())
+    if color.startswith("#") and len(color) == 7:
+        return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+    raise ValueError(f"Unknown color {color!r}")
+
+def _opacity(value):
+    return 1.0 if value == "none" else float(value)
+
+def _quads(a, b, half):
+    # The rectangles around the segments from a to b, half wide on either
+    # side, as (N, 4, 2)
+    d = b - a
+    length = np.hypot(d[:, 0], d[:, 1])
+    length[length == 0] = 1
+    n = np.column_stack((-d[:, 1], d[:, 0])) * (half / length)[:, np.newaxis]
+    return np.stack((a + n, b + n, b - n, a - n), axis=1)
+
+def _transform(planar, xs, ys):
+    # Local (xs, ys) of many shapes through their planar transforms, planar
+    # is (N, 6) and xs, ys are (K,) or (N, K). Gives (N, K, 2).
+    (a, b, c, d, e, f) = (planar[:, i:i + 1] for i in range(6))
+    return np.stack((a * xs + c * ys + e, b * xs + d * ys + f), axis=2)
+
+def _planar(elems):
+    return np.array([e.pos.planar() for e in elems], dtype=np.double).reshape(-1, 6)
+
+def _square_rings(elems, planar, grow):
+    # The corners of the squares, each grown by grow on every side. They
+    # can't shrink past nothing.
+    w = np.array([e.w for e in elems], dtype=np.double)[:, np.newaxis]
+    h = np.array([e.h for e in elems], dtype=np.double)[:, np.newaxis]
+    g = np.maximum(grow[:, np.newaxis], -np.minimum(w, h) / 2)
+    (w, h) = (w + g, h + g)
+    return _transform(planar, np.hstack((-g, w, w, -g)), np.hstack((-g, -g, h, h)))
+
+def _circle_rings(elems, planar, grow, sides):
+    r = np.maximum(np.array([e.r for e in elems], dtype=np.double) + grow, 0)[:, np.newaxis]
+    theta = np.linspace(0, np.pi * 2, sides, endpoint=False)
+    return _transform(planar, r * np.cos(theta), r * np.sin(theta))
+
+def _lines(lines, half, scale):
+    # The segments of the lines as quads, and their arrowheads, for all of
+    # them at once. The corners are left sharp, the rounding is well under a
+    # pixel at thumbnail sizes.
+    counts = np.array([len(line.points) for line in lines])
+    points = np.array([v for line in lines for v in line.points.values()], dtype=np.double)
+    points = points.reshape(-1, 3)[:, :2] * scale
+    last = np.cumsum(counts) - 1
+    width = _stroke_width(lines)
+
+    # Like MultiLine.draw, the path stops short of the end and the marker
+    # fills the rest. It's 10 by 7 in stroke widths, from the end of the path.
+    tail = points[last] - points[last - 1]
+    length = np.hypot(tail[:, 0], tail[:, 1])
+    length[length == 0] = 1
+    unit = tail / length[:, np.newaxis]
+    end = points[last] - unit * 10 * scale
+    tip = end + unit * (10 * scale * width)[:, np.newaxis]
+    side = np.column_stack((-unit[:, 1], unit[:, 0])) * (3.5 * scale * width)[:, np.newaxis]
+    arrows = np.stack((end + side, tip, tip, end - side), axis=1)
+
+    points[last] = end
+    # Segments that don't cross from one line to the next
+    line = np.repeat(np.arange(len(lines)), counts)[:-1]
+    inside = np.ones(len(points) - 1, dtype=bool)
+    inside[last[:-1]] = False
+    quads = _quads(points[:-1][inside], points[1:][inside], half[line[inside]])
+    return (quads, line[inside], arrows)
+
+def _scan(corners, layers, signs, height, width, layer_count):
+    # Scanline fill of convex (N, K, 2) polygons. Every sub-row a polygon
+    # crosses gives a span between its leftmost and rightmost crossing, and
+    # every pixel that span touches gets the part of it that's covered, times
+    # the sign of the polygon. Gives the (pixel, layer) key and the coverage
+    # of every pixel of every span.
+    ys = corners[:, :, 1] * SUBROWS
+    top = np.clip(np.floor(ys.min(axis=1)), 0, height * SUBROWS).astype(np.int64)
+    bottom = np.clip(np.ceil(ys.max(axis=1)), 0, height * SUBROWS).astype(np.int64)
+    counts = np.maximum(bottom - top, 0)
+
+    poly = np.repeat(np.arange(len(corners)), counts)
+    sub = top[poly] + np.arange(len(poly)) - (np.cumsum(counts) - counts)[poly]
+    yc = ((sub + 0.5) / SUBROWS)[:, np.newaxis]
+
+    a = corners[poly]
+    b = np.roll(corners, -1, axis=1)[poly]
+    (ax, ay, bx, by) = (a[:, :, 0], a[:, :, 1], b[:, :, 0], b[:, :, 1])
+    crosses = ((ay <= yc) & (yc < by)) | ((by <= yc) & (yc < ay))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = ax + (yc - ay) / (by - ay) * (bx - ax)
+    left = np.clip(np.where(crosses, x, np.inf).min(axis=1), 0, width)
+    right = np.clip(np.where(crosses, x, -np.inf).max(axis=1), 0, width)
+
+    keep = left < right
+    (poly, sub, left, right) = (poly[keep], sub[keep], left[keep], right[keep])
+
+    first = np.floor(left).astype(np.int64)
+    spans = np.ceil(right).astype(np.int64) - first
+    span = np.repeat(np.arange(len(first)), spans)
+    col = first[span] + np.arange(len(span)) - (np.cumsum(spans) - spans)[span]
+    cover = (np.minimum(col + 1, right[span]) - np.maximum(col, left[span])) / SUBROWS
+
+    owner = poly[span]
+    key = ((sub[span] // SUBROWS) * width + col) * layer_count + layers[owner]
+    return (key, cover * signs[owner])
+
+def _rasterize(polygons, height, width, layer_count):
+    # The coverage of every (pixel, layer) pair that has any, sorted by key.
+    # The shapes of a layer add up, but can't cover a pixel more than once.
+    keys = []
+    covers = []
+    for (corners, layers, signs) in polygons:
+        (key, cover) = _scan(corners, layers, signs, height, width, layer_count)
+        keys.append(key)
+        covers.append(cover)
+
+    (keys, inverse) = np.unique(np.concatenate(keys), return_inverse=True)
+    cover = np.bincount(inverse, weights=np.concatenate(covers), minlength=len(keys))
+    keep = cover > 1e-9
+    return (keys[keep], np.minimum(cover[keep], 1.0))
+
+def _composite(image, keys, cover, layer_count, colors, opacities):
+    # Paints the layers over the (h * w, 3) image. Every pixel is what was
+    # there with its layers painted over it, in
+    # order. With T the transparency left by the layers above a layer, a
+    # pixel comes out as background * T(all) + sum(color * alpha * T(above)),
+    # which is worked out for all of them at once from sums of log(1 - alpha).
+    pixel = keys // layer_count
+    layer = keys % layer_count
+    alpha = cover * opacities[layer]
+    logs = np.log1p(-np.minimum(alpha, 1 - 1e-9))
+
+    # suffix[i] is the sum of logs from i on, across all pixels
+    suffix = np.concatenate((np.cumsum(logs[::-1])[::-1], [0.0]))
+    (pixels, first, count) = np.unique(pixel, return_index=True, return_counts=True)
+    end = np.repeat(first + count, count)
+    above = np.exp(suffix[np.arange(len(logs)) + 1] - suffix[end])
+    total = np.exp(suffix[first] - suffix[first + count])
+
+    paint = colors[layer] * (alpha * above)[:, np.newaxis]
+    image[pixels] = image[pixels] * total[:, np.newaxis] + np.add.reduceat(paint, first, axis=0)
+
+def render(elements, width=256, height=None, pad=20, background=(255, 255, 255), bounds=None):
+    # Draw the squares, circles and lines among the elements into an (h, w, 3)
+    # array of 8 bit rgb. The view fits the bounds (a bounds.Bounds or
+    # (x0, y0, x1, y1)), or all the elements, with pad around them, into
+    # width, like the svg viewBox. height follows from the aspect ratio unless
+    # it's given, or the same as width if there's nothing to frame. Text is
+    # left out.
+    elements = list(elements)
+    if bounds is None:
+        bounds = of_elements(elements)
+    (x0, y0, x1, y1) = bounds
+    if not all(math.isfinite(v) for v in (x0, y0, x1, y1)) or x0 > x1 or y0 > y1:
+        # Nothing to frame, so just the background
+        height = width if height is None else height
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        image[:] = background
+        return image
+
+    (x0, y0, x1, y1) = (x0 - pad, y0 - pad, x1 + pad, y1 + pad)
+    scale = width / max(x1 - x0, 1e-9)
+    if height is None:
+        height = max(1, round((y1 - y0) * scale))
+    offset = np.array((x0, y0)) * scale
+
+    # Every element gets a layer for its fill and one for its stroke, in draw
+    # order, and the shapes are then made a kind at a time
+    colors = []
+    opacities = []
+    shapes = {Square: [], Circle: [], MultiLine: []}
+    for elem in elements:
+        t = type(elem)
+        if t not in shapes:
+            continue
+
+        fill = None
+        if t is not MultiLine:
+            color = parse_color(elem.fill)
+            if color is not None:
+                fill = len(colors)
+                colors.append(color)
+                opacities.append(_opacity(elem.fill_opacity))
+
+        stroke = None
+        color = parse_color(elem.stroke)
+        if color is not None and elem.stroke_width:
+            stroke = len(colors)
+            colors.append(color)
+            opacities.append(1.0)
+
+        if fill is not None or stroke is not None:
+            shapes[t].append((elem, fill, stroke))
+
+    # Polygons with the same number of sides go together, as (corners,
+    # layers, signs). Strokes are the shape grown by half the stroke width,
+    # less the shape shrunk by as much.
+    polygons = []
+
+    def add(corners, layers, sign=1.0):
+        polygons.append((corners - offset, layers, np.full(len(layers), sign)))
+
+    for (t, rings) in ((Square, _square_rings), (Circle, _circle_rings)):
+        if not shapes[t]:
+            continue
+
+        if t is Circle:
+            # Enough sides for the biggest of them
+            radius = max(e.r for (e, _, _) in shapes[t]) * scale
+            sides = int(np.clip(np.pi * 2 * radius / CIRCLE_STEP, *CIRCLE_SIDES))
+            rings = functools.partial(_circle_rings, sides=sides)
+
+        (elems, fills, strokes) = zip(*shapes[t])
+        planar = _planar(elems)
+        fills = np.array([-1 if f is None else f for f in fills])
+        strokes = np.array([-1 if s is None else s for s in strokes])
+
+        filled = fills >= 0
+        if filled.any():
+            chosen = [e for (e, f) in zip(elems, filled) if f]
+            add(rings(chosen, planar[filled], np.zeros(len(chosen))) * scale, fills[filled])
+
+        stroked = strokes >= 0
+        if stroked.any():
+            chosen = [e for (e, s) in zip(elems, stroked) if s]
+            half = _half(chosen, scale) / scale
+            add(rings(chosen, planar[stroked], half) * scale, strokes[stroked])
+            add(rings(chosen, planar[stroked], -half) * scale, strokes[stroked], -1.0)
+
+    lines = [(e, s) for (e, _, s) in shapes[MultiLine] if len(e.points) > 1]
+    if lines:
+        (elems, layers) = zip(*lines)
+        layers = np.array(layers)
+        (segments, owner, arrows) = _lines(elems, _half(elems, scale), scale)
+        add(segments, layers[owner])
+        add(arrows, layers)
+
+    image = np.empty((height * width, 3), dtype=np.double)
+    image[:] = background
+    if polygons:
+        (keys, cover) = _rasterize(polygons, height, width, len(colors))
+        _composite(image, keys, cover, len(colors), np.array(colors, dtype=np.double), np.array(opacities))
+
+    return np.clip(np.rint(image), 0, 255).astype(np.uint8).reshape(height, width, 3)
+
+def _stroke_width(elems):
+    return np.array([e.stroke_width for e in elems], dtype=np.double)
+
+def _half(elems, scale):
+    # Half the stroke widths of the elements, in pixels
+    return np.maximum(_stroke_width(elems) * scale, MIN_STROKE) / 2
+
+def _chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+def encode_png(image, level=6):
+    # An (h, w, 3) uint8 array as a png file
+    (height, width, _) = image.shape
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, width * 3)
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+        _chunk(b"IDAT", zlib.compress(rows.tobytes(), level)),
+        _chunk(b"IEND", b""),
+    ))
+
+def write_png(path, image, level=6):
+    with open(path, "wb") as f:
+        f.write(encode_png(image, level))
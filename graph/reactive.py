@@ -0,0 +1,201 @@
+import functools
+
+# The tracker currently recording, if any. Nothing is recorded outside of a
+# Tracker, so the bookkeeping costs next to nothing when it isn't used.
+_current = None
+
+
+class _Anchor():
+    # A point that was asked from an element, like n1.anchor(VDir.BELOW)
+    __slots__ = ["elem", "name", "args"]
+
+    def __init__(self, elem, name, args):
+        self.elem = elem
+        self.name = name
+        self.args = args
+
+    def compute(self):
+        return getattr(self.elem, self.name)(*self.args)
+
+class _Op():
+    # A point derived from other points, like adjust(point, (0, 20))
+    __slots__ = ["fn", "args", "kwargs"]
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def compute(self):
+        return self.fn(*self.args, **self.kwargs)
+
+def _points_in(values):
+    for value in values:
+        if type(value) is list or type(value) is tuple:
+            yield from _points_in(value)
+        elif hasattr(value, "origin"):
+            yield value
+
+def _sources(point, memo):
+    # The ids of all the elements the point was derived from
+    key = id(point)
+    if key in memo:
+        return memo[key]
+
+    sources = set()
+    origin = point.origin
+    if type(origin) is _Anchor:
+        sources.add(id(origin.elem))
+    elif type(origin) is _Op:
+        for p in _points_in((origin.args, tuple(origin.kwargs.values()))):
+            sources |= _sources(p, memo)
+
+    memo[key] = sources
+    return sources
+
+def tracked(init):
+    # For the __init__ of elements. Records how the element was built.
+    @functools.wraps(init)
+    def wrapper(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        if _current is not None:
+            _current.record(self, args, kwargs)
+    return wrapper
+
+def anchored(method):
+    # For the methods of elements that hand out points
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        point = method(self, *args)
+        if _current is not None and point is not None:
+            point.origin = _Anchor(self, method.__name__, args)
+        return point
+    return wrapper
+
+def derived(fn):
+    # For functions that make a new point out of other points
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        point = fn(*args, **kwargs)
+        if _current is not None:
+            point.origin = _Op(fn, args, kwargs)
+        return point
+    return wrapper
+
+class Tracker():
+    # Records the elements built while it's active, and which elements the
+    # points they were given came from. When an element is moved or rebuilt,
+    # only the elements that (transitively) depend on it are recalculated, in
+    # the order they were originally built. The points they depend on are
+    # updated in place, so every reference to them stays valid.
+    #
+    #     with Tracker(scene) as tracker:
+    #         n1 = scene.add(Circle(p(0, 0), 20))
+    #         n2 = scene.add(Circle(adjust(n1.anchor(VDir.BELOW), (0, 20)), 20))
+    #     tracker.move(n1, 50, 0) # n2 follows
+    def __init__(self, scene=None):
+        self.scene = scene
+        self.records = []
+        self.index = {}
+        self.dependents = {}
+        self.prev = None
+
+    def __enter__(self):
+        global _current
+        self.prev = _current
+        _current = self
+        return self
+
+    def __exit__(self, *exc):
+        global _current
+        _current = self.prev
+
+    def record(self, elem, args, kwargs):
+        i = len(self.records)
+        self.index[id(elem)] = i
+        self.records.append((elem, args, kwargs))
+
+        memo = {}
+        for point in _points_in((args, tuple(kwargs.values()))):
+            for source in _sources(point, memo):
+                self.dependents.setdefault(source, set()).add(i)
+
+    def rebuild(self, elem, *args, **kwargs):
+        # Build the element again from new inputs, and then everything that
+        # depends on it
+        global _current
+        i = self.index[id(elem)]
+        self.records[i] = (elem, args, kwargs)
+
+        # The new inputs might depend on other elements than before
+        memo = {}
+        for point in _points_in((args, tuple(kwargs.values()))):
+            for source in _sources(point, memo):
+                self.dependents.setdefault(source, set()).add(i)
+
+        prev = _current
+        _current = None
+        try:
+            self._propagate(i)
+        finally:
+            _current = prev
+
+    def move(self, elem, dx, dy):
+        # Move an element that was placed by a point as its first argument
+        import common
+
+        (_, args, kwargs) = self.records[self.index[id(elem)]]
+        (pos, *rest) = args
+        if not hasattr(pos, "origin"):
+            raise TypeError
+
+        moved = common.adjust(pos, (dx, dy))
+        moved.origin = _Op(common.adjust, (pos, (dx, dy)), {})
+        self.rebuild(elem, moved, *rest, **kwargs)
+
+    def affected(self, i):
+        # The indexes of the records that have to be rebuilt if record i
+        # changes, including i itself, in build order
+        todo = [i]
+        found = {i}
+        while todo:
+            (elem, _, _) = self.records[todo.pop()]
+            for dep in self.dependents.get(id(elem), ()):
+                if dep not in found:
+                    found.add(dep)
+                    todo.append(dep)
+        return sorted(found)
+
+    def _propagate(self, i):
+        affected = self.affected(i)
+        dirty = {id(self.records[j][0]) for j in affected}
+        memo = {}
+        resolved = set()
+
+        for j in affected:
+            (elem, args, kwargs) = self.records[j]
+            for point in _points_in((args, tuple(kwargs.values()))):
+                self._resolve(point, dirty, memo, resolved)
+
+            elem.__init__(*args, **kwargs)
+            if self.scene is not None and id(elem) in self.scene.index:
+                self.scene.update(elem)
+
+    def _resolve(self, point, dirty, memo, resolved):
+        if id(point) in resolved or point.origin is None:
+            return
+        resolved.add(id(point))
+
+        if not (_sources(point, memo) & dirty):
+            return
+
+        origin = point.origin
+        if type(origin) is _Op:
+            for p in _points_in((origin.args, tuple(origin.kwargs.values()))):
+                self._resolve(p, dirty, memo, resolved)
+
+        new = origin.compute()
+        point.position = new.position
+        point.direction = new.direction
+        point.halign = new.halign
+        point.valign = new.valign
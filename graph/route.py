@@ -0,0 +1,321 @@
+import bisect
+import functools
+import heapq
+import math
+
+import layoutcache
+from bounds import of_element
+from common import (
+    HDir,
+    VDir,
+    p,
+    path_hvh,
+)
+from spatial import (
+    GridIndex,
+)
+
+# The directions a route can travel in, as (dx, dy)
+_DIRS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+
+
+def _direction(point):
+    # The direction a route leaves (or enters) a point in, going by its
+    # alignment. Corners go vertically, like the path functions tend to.
+    if point.valign is VDir.BELOW:
+        return 1
+    if point.valign is VDir.ABOVE:
+        return 3
+    if point.halign is HDir.RIGHT:
+        return 0
+    if point.halign is HDir.LEFT:
+        return 2
+    return None
+
+@functools.lru_cache(maxsize=None)
+def _min_bends(d, sx, sy, arrive):
+    # The fewest bends it takes to get somewhere in the (sx, sy) direction
+    # when heading in d, and arrive heading in arrive, if there were no
+    # obstacles. Arriving in the wrong direction counts as one more bend, like
+    # in the search. This is the part of the heuristic that makes the search
+    # go straight for the goal, instead of trying every staircase on the way.
+    if sx == 0 and sy == 0:
+        return 0
+
+    best = None
+    todo = [(d,)] if d is not None else [(nd,) for nd in range(4)]
+    while todo:
+        seq = todo.pop()
+        bends = len(seq) - 1
+        if best is not None and bends >= best:
+            continue
+
+        if _reaches(seq, sx, sy):
+            cost = bends + (arrive is not None and seq[-1] != arrive)
+            if best is None or cost < best:
+                best = cost
+
+        if bends < 4:
+            last = seq[-1]
+            for nd in ((last + 1) % 4, (last + 3) % 4):
+                todo.append(seq + (nd,))
+    return best
+
+def _reaches(seq, sx, sy):
+    # Can the directions in seq reach the (sx, sy) side, with some positive
+    # length for every segment? The first may also be left out.
+    for axis, sign in ((0, sx), (1, sy)):
+        signs = {_DIRS[d][axis] for d in seq} - {0}
+        forced = {_DIRS[d][axis] for d in seq[1:]} - {0}
+        if sign != 0 and sign not in signs:
+            return False
+        if sign == 0 and forced and len(signs) < 2:
+            return False
+    return True
+
+def _xy(point):
+    v = point.position.as_vec()
+    return (v.x, v.y)
+
+def _near(a, b):
+    # The anchors come out of trig, so ends that line up can be a rounding
+    # error apart
+    return abs(a - b) < 1e-9
+
+def _simplify(coords):
+    # Drop repeated points and the points in the middle of straight runs
+    coords = [c for i, c in enumerate(coords) if i == 0 or not (_near(c[0], coords[i - 1][0]) and _near(c[1], coords[i - 1][1]))]
+    out = [coords[0]]
+    for i in range(1, len(coords) - 1):
+        (ax, ay) = out[-1]
+        (bx, by) = coords[i]
+        (cx, cy) = coords[i + 1]
+        if (_near(ax, bx) and _near(bx, cx)) or (_near(ay, by) and _near(by, cy)):
+            continue
+        out.append(coords[i])
+    out.append(coords[-1])
+    return out
+
+def _merge(intervals):
+    # The union of open intervals, as sorted lists of starts and ends. Two
+    # intervals that only touch stay apart, the point between them is free.
+    starts = []
+    ends = []
+    for (a, b) in sorted(intervals):
+        if ends and a < ends[-1]:
+            ends[-1] = max(ends[-1], b)
+        else:
+            starts.append(a)
+            ends.append(b)
+    return (starts, ends)
+
+def _inside(merged, v):
+    (starts, ends) = merged
+    k = bisect.bisect_left(starts, v) - 1
+    return k >= 0 and v < ends[k]
+
+def _band(coords, lo, hi):
+    # Which band between two neighbouring coordinates the span lies in, if any
+    i = bisect.bisect_right(coords, lo) - 1
+    if 0 <= i < len(coords) - 1 and hi <= coords[i + 1]:
+        return i
+    return None
+
+class _Grid():
+    # The lines a route can turn on: the sides of the obstacles, and the
+    # lines through the two ends of the route. Every obstacle side is a grid
+    # line, so an obstacle covers the bands between grid lines either
+    # completely or not at all. For each band we keep the parts of the lines
+    # crossing it that are inside an obstacle, then a step across the band is
+    # blocked if its line is in one of them.
+    def __init__(self, boxes, points):
+        self.xs = sorted({x for (x0, _, x1, _) in boxes for x in (x0, x1)} | {x for (x, _) in points})
+        self.ys = sorted({y for (_, y0, _, y1) in boxes for y in (y0, y1)} | {y for (_, y) in points})
+
+        columns = [[] for _ in range(max(len(self.xs) - 1, 0))]
+        rows = [[] for _ in range(max(len(self.ys) - 1, 0))]
+        for (x0, y0, x1, y1) in boxes:
+            for i in range(bisect.bisect_left(self.xs, x0), bisect.bisect_left(self.xs, x1)):
+                columns[i].append((y0, y1))
+            for j in range(bisect.bisect_left(self.ys, y0), bisect.bisect_left(self.ys, y1)):
+                rows[j].append((x0, x1))
+        self.columns = [_merge(c) for c in columns]
+        self.rows = [_merge(r) for r in rows]
+
+    def blocked(self, x0, y0, x1, y1):
+        # Does a step between neighbouring grid lines pass through the inside
+        # of an obstacle? Running along the side of one is fine.
+        if y0 == y1:
+            i = _band(self.xs, min(x0, x1), max(x0, x1))
+            return i is not None and _inside(self.columns[i], y0)
+        else:
+            j = _band(self.ys, min(y0, y1), max(y0, y1))
+            return j is not None and _inside(self.rows[j], x0)
+
+    def next(self, x, y, d, bounds):
+        # The next line along the direction, if it's inside the bounds
+        (dx, dy) = _DIRS[d]
+        if dx > 0:
+            i = bisect.bisect_right(self.xs, x)
+            if i < len(self.xs) and self.xs[i] <= bounds[2]:
+                return (self.xs[i], y)
+        elif dx < 0:
+            i = bisect.bisect_left(self.xs, x) - 1
+            if i >= 0 and self.xs[i] >= bounds[0]:
+                return (self.xs[i], y)
+        elif dy > 0:
+            i = bisect.bisect_right(self.ys, y)
+            if i < len(self.ys) and self.ys[i] <= bounds[3]:
+                return (x, self.ys[i])
+        else:
+            i = bisect.bisect_left(self.ys, y) - 1
+            if i >= 0 and self.ys[i] >= bounds[1]:
+                return (x, self.ys[i])
+        return None
+
+class Router():
+    # Routes edges around obstacles with only horizontal and vertical
+    # segments. The obstacles are grown by margin, and the search runs over
+    # the sparse grid made by the sides of the grown obstacles and the ends of
+    # the edge, so the number of places a route can turn only depends on the
+    # number of obstacles nearby. The routes come out as lists of points that
+    # can be given straight to MultiLine.
+    #
+    # The edges are expected to start and end on the sides of the obstacles,
+    # like the anchors of a shape. They leave and enter in the direction the
+    # alignment of the anchor points to.
+    #
+    # A search first only looks at the obstacles in a window around the two
+    # ends, grown by window. Only if that fails are all of them used.
+    def __init__(self, obstacles, margin=20, bend_penalty=20, window=200, cache=None):
+        self.margin = margin
+        self.bend_penalty = bend_penalty
+        self.window = window
+        self.cache = cache if cache is not None else layoutcache.default()
+
+        self.boxes = []
+        for obstacle in obstacles:
+            (x0, y0, x1, y1) = of_element(obstacle)
+            self.boxes.append((x0 - margin, y0 - margin, x1 + margin, y1 + margin))
+        self.index = GridIndex.bulk_load(self.boxes, self.boxes)
+
+    def _stub(self, point):
+        # Where the route starts for real, on the edge of the grown obstacle
+        d = _direction(point)
+        (x, y) = _xy(point)
+        if d is None:
+            return ((x, y), None)
+
+        (dx, dy) = _DIRS[d]
+        return ((x + dx * self.margin, y + dy * self.margin), d)
+
+    def _heuristic(self, x, y, d, gx, gy, arrive):
+        dx = gx - x
+        dy = gy - y
+        sx = (dx > 0) - (dx < 0)
+        sy = (dy > 0) - (dy < 0)
+        return abs(dx) + abs(dy) + self.bend_penalty * _min_bends(d, sx, sy, arrive)
+
+    def _search(self, grid, start, start_dir, goal, goal_dir, bounds):
+        # A* over the grid. The cost is the length plus a penalty for every
+        # bend, which includes turning into the goal if we don't arrive going
+        # into it already.
+        (gx, gy) = goal
+        arrive = None if goal_dir is None else (goal_dir + 2) % 4
+
+        # Ties are broken towards the larger cost so far, that is the state
+        # closest to the goal, which keeps the open set small on open ground
+        counter = 0
+        todo = [(self._heuristic(*start, start_dir, gx, gy, arrive), 0, counter, start, start_dir)]
+        best = {(start, start_dir): 0}
+        came = {}
+        while todo:
+            (_, g, _, (x, y), d) = heapq.heappop(todo)
+            g = -g
+            if best.get(((x, y), d), g) < g:
+                continue
+
+            if (x, y) == goal:
+                coords = [(x, y)]
+                state = ((x, y), d)
+                while state in came:
+                    state = came[state]
+                    coords.append(state[0])
+                return coords[::-1]
+
+            for nd in range(4):
+                # Never turn straight back
+                if d is not None and nd == (d + 2) % 4:
+                    continue
+
+                nxt = grid.next(x, y, nd, bounds)
+                if nxt is None or grid.blocked(x, y, *nxt):
+                    continue
+
+                cost = g + abs(nxt[0] - x) + abs(nxt[1] - y)
+                if d is not None and nd != d:
+                    cost += self.bend_penalty
+                if nxt == goal and arrive is not None and nd != arrive:
+                    cost += self.bend_penalty
+
+                state = (nxt, nd)
+                if cost < best.get(state, math.inf):
+                    best[state] = cost
+                    came[state] = ((x, y), d)
+                    counter += 1
+                    f = cost + self._heuristic(*nxt, nd, gx, gy, arrive)
+                    heapq.heappush(todo, (f, -cost, counter, nxt, nd))
+
+        return None
+
+    def route(self, start, end):
+        return self.route_all([(start, end)])[0]
+
+    def route_all(self, pairs):
+        # Route a batch of (start, end) point pairs. They all share the
+        # obstacles and the index over them. With a cache, the routes of the
+        # whole batch are stored under the hash of the obstacles and the ends.
+        pairs = list(pairs)
+
+        key = None
+        if self.cache is not None:
+            ends = [(_xy(start), _direction(start), _xy(end), _direction(end)) for (start, end) in pairs]
+            key = layoutcache.key_of("route.Router.route_all", self.boxes, self.margin, self.bend_penalty, self.window, ends)
+            data = self.cache.get(key)
+            if data is not None:
+                (found, _) = layoutcache.unpack_paths(data)
+                return [self._points(start, end, coords) for ((start, end), coords) in zip(pairs, found)]
+
+        found = [self._find(start, end) for (start, end) in pairs]
+        if key is not None:
+            self.cache.put(key, layoutcache.pack_paths(found))
+        return [self._points(start, end, coords) for ((start, end), coords) in zip(pairs, found)]
+
+    def _find(self, start, end):
+        # The corners of the route between the two points, without the points
+        # themselves, or None if there is none
+        (s, sd) = self._stub(start)
+        (e, ed) = self._stub(end)
+
+        w = self.window
+        bounds = (min(s[0], e[0]) - w, min(s[1], e[1]) - w, max(s[0], e[0]) + w, max(s[1], e[1]) + w)
+        grid = _Grid(self.index.query(*bounds), (s, e))
+        coords = self._search(grid, s, sd, e, ed, bounds)
+        if coords is None:
+            grid = _Grid(self.boxes, (s, e))
+            everywhere = (-math.inf, -math.inf, math.inf, math.inf)
+            coords = self._search(grid, s, sd, e, ed, everywhere)
+
+        if coords is None:
+            return None
+        return _simplify([_xy(start)] + coords + [_xy(end)])[1:-1]
+
+    def _points(self, start, end, coords):
+        if coords is None:
+            # Boxed in, fall back to the plain path
+            return path_hvh(start, end)
+
+        points = [start]
+        points.extend(p(x, y) for (x, y) in coords)
+        points.append(end)
+        return points
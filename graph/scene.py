@@ -0,0 +1,115 @@
+import bounds
+import canvas
+import instrument
+import node
+import parallel
+import spatial
+from common import (
+    HDir,
+    VDir,
+    v2p,
+)
+from vec import (
+    Affine2,
+    Vec2,
+)
+
+
+class Scene():
+    # The elements of a diagram in draw order, along with the extents of each
+    # of them. The extents are calculated once when an element is added, and
+    # the bounds of the whole scene are kept up to date as we go, so fitting
+    # never has to look at every element again.
+    def __init__(self, elements=()):
+        self.elements = []
+        self.extents = []
+        self.index = {}
+        self.bounds = bounds.Bounds()
+
+        self.extend(elements)
+
+    def __iter__(self):
+        return iter(self.elements)
+
+    def __len__(self):
+        return len(self.elements)
+
+    def add(self, elem):
+        ext = bounds.of_element(elem)
+
+        self.index[id(elem)] = len(self.elements)
+        self.elements.append(elem)
+        self.extents.append(ext)
+        self.bounds.add(ext)
+        return elem
+
+    def extend(self, elems):
+        for elem in elems:
+            self.add(elem)
+
+    def update(self, elem):
+        # The element has changed shape or moved. The bounds might have shrunk,
+        # so that has to be recalculated from the stored extents.
+        i = self.index[id(elem)]
+        old = self.extents[i]
+        ext = bounds.of_element(elem)
+        self.extents[i] = ext
+
+        # If the old extents didn't touch the edge of the bounds, they can't
+        # have been holding it out
+        if self.bounds.contains(old):
+            self.bounds.add(ext)
+            return
+
+        self.bounds = bounds.Bounds.union_all(self.extents)
+
+    def subset_bounds(self, elements):
+        out = bounds.Bounds()
+        for elem in elements:
+            i = self.index.get(id(elem))
+            out.add(self.extents[i] if i is not None else bounds.of_element(elem))
+        return out
+
+    def size(self, elements=None):
+        if elements is None:
+            return self.bounds.size()
+
+        return self.subset_bounds(elements).size()
+
+    def fit(self, pad, elements=None):
+        # Same as node.fit, but over the stored extents
+        (min, size) = self.size(elements)
+        size += pad*2
+        return (v2p(min * Affine2.translate(-pad, -pad), HDir.RIGHT, VDir.BELOW), size.x, size.y)
+
+    def spatial_index(self, cell=None):
+        return spatial.GridIndex.bulk_load(self.elements, self.extents, cell)
+
+    def draw(self, write, pad=0, workers=None, threads=False, fragments=None):
+        # With workers the elements are drawn in a pool, see
+        # parallel.draw_elements, and with a fragments.FragmentCache the
+        # elements drawn before are copied from it. The output is the same
+        # either way. The cache lives in this process, so it can't be used
+        # along with workers.
+        if fragments is not None and workers is not None:
+            raise ValueError("fragments can't be used with workers")
+
+        (fitp, w, h) = self.fit(pad)
+        canvas.write_preamble(write, (fitp.position, Vec2(w, h)))
+
+        if fragments is not None:
+            fragments.draw_elements(write, self.elements)
+        elif workers is None:
+            node.draw_elements(write, self.elements)
+        else:
+            parallel.draw_elements(write, self.elements, workers, threads=threads)
+
+        canvas.write_tail(write)
+        instrument.render_done()
+
+    def rasterize(self, width=256, height=None, pad=20):
+        # A thumbnail of the scene as an (h, w, 3) array, framed like draw
+        # frames the svg with pad around it. See raster.render, which needs
+        # numpy, so it's only imported here.
+        import raster
+        return raster.render(self.elements, width, height, pad, bounds=self.bounds)
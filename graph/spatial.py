@@ -0,0 +1,178 @@
+import math
+
+import bounds
+
+
+def _rect_distance(ext, x, y):
+    (x0, y0, x1, y1) = ext
+    dx = max(x0 - x, 0, x - x1)
+    dy = max(y0 - y, 0, y - y1)
+    return math.sqrt(dx*dx + dy*dy)
+
+class GridIndex():
+    # A uniform grid over the extents of the elements. Every element is listed
+    # in each cell its extents touch, so a query only has to look at the cells
+    # covering the area it's interested in. Extents are (x0, y0, x1, y1), or a
+    # bounds.Bounds.
+    def __init__(self, cell=100):
+        self.cell = cell
+        self.cells = {}
+        self.items = {}
+        # The range of cell coordinates that has ever been occupied, so the
+        # nearest neighbour search knows when to stop
+        self.range = None
+
+    @staticmethod
+    def bulk_load(elements, extents=None, cell=None):
+        elements = list(elements)
+        if extents is None:
+            extents = [bounds.of_element(e) for e in elements]
+
+        if cell is None:
+            # Make the cells about as large as the average element, that keeps
+            # both the number of cells per element and elements per cell low
+            total = sum(max(x1 - x0, y1 - y0) for (x0, y0, x1, y1) in extents)
+            cell = max(total / len(extents), 1.0) if extents else 100
+
+        index = GridIndex(cell)
+        for elem, ext in zip(elements, extents):
+            index.insert(elem, ext)
+        return index
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, elem):
+        return id(elem) in self.items
+
+    def _cell_range(self, ext):
+        (x0, y0, x1, y1) = ext
+        return (
+            math.floor(x0 / self.cell),
+            math.floor(y0 / self.cell),
+            math.floor(x1 / self.cell),
+            math.floor(y1 / self.cell),
+        )
+
+    def _cells_in(self, ext):
+        (i0, j0, i1, j1) = self._cell_range(ext)
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                yield (i, j)
+
+    def insert(self, elem, ext=None):
+        if ext is None:
+            ext = bounds.of_element(elem)
+
+        key = id(elem)
+        if key in self.items:
+            self.remove(elem)
+
+        self.items[key] = (elem, ext)
+        for cell in self._cells_in(ext):
+            self.cells.setdefault(cell, set()).add(key)
+
+        (i0, j0, i1, j1) = self._cell_range(ext)
+        if self.range is None:
+            self.range = (i0, j0, i1, j1)
+        else:
+            (ri0, rj0, ri1, rj1) = self.range
+            self.range = (min(ri0, i0), min(rj0, j0), max(ri1, i1), max(rj1, j1))
+
+    def remove(self, elem):
+        # The range is left as it is. It only has to cover every occupied
+        # cell, and working out how far it can shrink means looking at all
+        # of them.
+        key = id(elem)
+        (_, ext) = self.items.pop(key)
+        for cell in self._cells_in(ext):
+            members = self.cells[cell]
+            members.discard(key)
+            if not members:
+                del self.cells[cell]
+
+    def query(self, x0, y0, x1, y1):
+        # All the elements whose extents overlap the given rectangle
+        (i0, j0, i1, j1) = self._cell_range((x0, y0, x1, y1))
+
+        # A large query (think viewport) would visit mostly empty cells, so
+        # walk the occupied ones instead when there are fewer of those
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self.cells):
+            cells = [
+                members for (i, j), members in self.cells.items()
+                if i0 <= i <= i1 and j0 <= j <= j1
+            ]
+        else:
+            cells = [
+                self.cells[(i, j)]
+                for i in range(i0, i1 + 1)
+                for j in range(j0, j1 + 1)
+                if (i, j) in self.cells
+            ]
+
+        found = []
+        seen = set()
+        for members in cells:
+            for key in members:
+                if key in seen:
+                    continue
+                seen.add(key)
+
+                (elem, (ex0, ey0, ex1, ey1)) = self.items[key]
+                if ex0 <= x1 and ex1 >= x0 and ey0 <= y1 and ey1 >= y0:
+                    found.append(elem)
+        return found
+
+    def nearest(self, x, y, k=1):
+        # The k elements closest to the point, measured to the edge of their
+        # extents, closest first. The search walks rings of cells outward
+        # from the point, and stops when nothing further out can be closer.
+        if self.range is None:
+            return []
+
+        ci = math.floor(x / self.cell)
+        cj = math.floor(y / self.cell)
+        (ri0, rj0, ri1, rj1) = self.range
+        max_ring = max(abs(ci - ri0), abs(ci - ri1), abs(cj - rj0), abs(cj - rj1))
+        # The rings before the occupied range is reached are all empty
+        min_ring = max(ri0 - ci, ci - ri1, rj0 - cj, cj - rj1, 0)
+
+        best = []
+        seen = set()
+        for ring in range(min_ring, max_ring + 1):
+            for (i, j) in _ring(ci, cj, ring, self.range):
+                for key in self.cells.get((i, j), ()):
+                    if key in seen:
+                        continue
+                    seen.add(key)
+
+                    (elem, ext) = self.items[key]
+                    best.append((_rect_distance(ext, x, y), len(seen), elem))
+
+            best.sort(key=lambda b: b[:2])
+            del best[k:]
+            # Everything in the rings after this one is at least this far away
+            if len(best) == k and best[-1][0] <= ring * self.cell:
+                break
+
+        return [elem for (_, _, elem) in best]
+
+def _ring(ci, cj, ring, bounds):
+    # The cells of the ring around (ci, cj), only the ones inside the range of
+    # cells (i0, j0, i1, j1)
+    (i0, j0, i1, j1) = bounds
+    if ring == 0:
+        yield (ci, cj)
+        return
+
+    irange = range(max(ci - ring, i0), min(ci + ring, i1) + 1)
+    for j in (cj - ring, cj + ring):
+        if j0 <= j <= j1:
+            for i in irange:
+                yield (i, j)
+
+    jrange = range(max(cj - ring + 1, j0), min(cj + ring - 1, j1) + 1)
+    for i in (ci - ring, ci + ring):
+        if i0 <= i <= i1:
+            for j in jrange:
+                yield (i, j)
@@ -0,0 +1,70 @@
+import asyncio
+
+import canvas
+import instrument
+import node
+from vec import Vec2
+
+# Elements drawn between giving the event loop a turn
+BATCH_SIZE = 500
+
+
+class _Chunks():
+    # Where the SvgWriter of a stream hands its output, to be taken away a
+    # chunk at a time
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, b):
+        self.chunks.append(b)
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        out = b"".join(self.chunks)
+        self.chunks = []
+        return out
+
+async def render(scene, pad=0, batch_size=BATCH_SIZE, chunk_size=1 << 16, compress=False, fragments=None):
+    # Scene.draw into an SvgWriter, as an async iterator of the encoded
+    # chunks, which put together are the same bytes. It's meant for serving
+    # from an event loop:
+    #
+    #     async for chunk in stream.render(scene):
+    #         await response.write(chunk)
+    #
+    # The elements are drawn batch_size at a time with the loop getting a
+    # turn in between, so a large render doesn't hold it up. Nothing is drawn
+    # ahead of what the consumer has asked for, so a slow client only ever
+    # has the current chunk waiting on it.
+    chunks = _Chunks()
+    out = canvas.SvgWriter(chunks, chunk_size=chunk_size, compress=compress)
+    elements = list(scene.elements)
+
+    (fitp, w, h) = scene.fit(pad)
+    canvas.write_preamble(out, (fitp.position, Vec2(w, h)))
+
+    for start in range(0, len(elements), batch_size):
+        batch = elements[start:start + batch_size]
+        if fragments is not None:
+            fragments.draw_elements(out, batch)
+        else:
+            node.draw_elements(out, batch)
+
+        if chunks.chunks:
+            yield chunks.take()
+        await asyncio.sleep(0)
+
+    canvas.write_tail(out)
+    out.close()
+    yield chunks.take()
+    instrument.render_done()
+
+async def write_to(writer, scene, **kwargs):
+    # Streams the render into an asyncio.StreamWriter, waiting for it to
+    # drain after every chunk. kwargs are those of render.
+    async for chunk in render(scene, **kwargs):
+        writer.write(chunk)
+        await writer.drain()
@@ -1,6 +1,96 @@
 import math
+import os
+
+# The numeric backend, picked once at import from GRAPH_BACKEND. "numpy" keeps
+# matrices and vector arrays in numpy arrays. "python" uses tuples and lists of
+# floats and never imports numpy, which is most of the startup time of a small
+# render, and is faster for the tiny vectors and matrices anyway. The two have
+# the same API, only what inner holds differs.
+BACKEND = os.environ.get("GRAPH_BACKEND", "numpy")
+
+if BACKEND == "numpy":
+    import numpy as np
+elif BACKEND == "python":
+    np = None
+else:
+    raise ValueError(f"Unknown GRAPH_BACKEND {BACKEND!r}, expected numpy or python")
+
+# The matrix operations of Mat4, on whatever the backend stores as inner. For
+# numpy that's a 4x4 array, for python a flat tuple of the 16 values, row by
+# row.
+if np is not None:
+    def _matrix(rows):
+        return np.array(rows, dtype=np.double)
+
+    def _matmul(a, b):
+        return np.dot(a, b)
+
+    def _apply(m, x, y, z):
+        return np.dot(m, np.array((x, y, z, 1.0)))[:3]
+
+    def _apply_array(m, inner):
+        return inner @ m[0:3, 0:3].T + m[0:3, 3]
+
+    def _planar(m):
+        return (m[0, 0], m[1, 0], m[0, 1], m[1, 1], m[0, 3], m[1, 3])
+
+    def _translation(m):
+        return m[0:3, 3]
+
+    def _linear(m):
+        new = np.copy(m)
+        new[0:3, 3] = 0
+        new[3, 3] = 1
+        return new
+
+    def _affine(m):
+        new = np.copy(m)
+        new[0:3, 0:3] = np.identity(3)
+        new[3, 0:3] = 0
+        return new
+
+    def _values(m):
+        return m.ravel().tolist()
+else:
+    def _matrix(rows):
+        return tuple(float(v) for row in rows for v in row)
+
+    def _matmul(a, b):
+        return tuple(
+            a[i] * b[j] + a[i + 1] * b[j + 4] + a[i + 2] * b[j + 8] + a[i + 3] * b[j + 12]
+            for i in (0, 4, 8, 12)
+            for j in range(4)
+        )
+
+    def _apply(m, x, y, z):
+        return (
+            m[0] * x + m[1] * y + m[2] * z + m[3],
+            m[4] * x + m[5] * y + m[6] * z + m[7],
+            m[8] * x + m[9] * y + m[10] * z + m[11],
+        )
+
+    def _apply_array(m, inner):
+        return [_apply(m, x, y, z) for (x, y, z) in inner]
+
+    def _planar(m):
+        return (m[0], m[4], m[1], m[5], m[3], m[7])
+
+    def _translation(m):
+        return (m[3], m[7], m[11])
 
-import numpy as np
+    def _linear(m):
+        return m[0:3] + (0.0,) + m[4:7] + (0.0,) + m[8:11] + (0.0,) + m[12:15] + (1.0,)
+
+    def _affine(m):
+        return (
+            1.0, 0.0, 0.0, m[3],
+            0.0, 1.0, 0.0, m[7],
+            0.0, 0.0, 1.0, m[11],
+            0.0, 0.0, 0.0, m[15],
+        )
+
+    def _values(m):
+        return list(m)
 
 
 def _coerce(other, size):
@@ -19,152 +109,494 @@ def _coerce(other, size):
     return None
 
 class Vec():
-    __slots__ = ["inner"]
+    __slots__ = ["x", "y", "z"]
 
     def __init__(self, x, y, z = 0.0):
-        self.inner = np.array((x, y, z), dtype=np.double)
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    # The arithmetic is spelled out per component. Scalars are the common
+    # case (unit, scaling by a radius), so they skip the coercion entirely.
 
     def __add__(self, other):
+        if isinstance(other, (int, float)):
+            return self.__class__(self.x + other, self.y + other, self.z + other)
+
         other = _coerce(other, 3)
         if other is None:
             return NotImplemented
 
-        return self.__class__(*map(lambda i: i[0] + i[1], zip(self.inner, other.inner)))
+        return self.__class__(self.x + other.x, self.y + other.y, self.z + other.z)
 
     def __sub__(self, other):
+        if isinstance(other, (int, float)):
+            return self.__class__(self.x - other, self.y - other, self.z - other)
+
         other = _coerce(other, 3)
         if other is None:
             return NotImplemented
 
-        return self.__class__(*map(lambda i: i[0] - i[1], zip(self.inner, other.inner)))
+        return self.__class__(self.x - other.x, self.y - other.y, self.z - other.z)
 
     def __truediv__(self, other):
+        if isinstance(other, (int, float)):
+            return self.__class__(self.x / other, self.y / other, self.z / other)
+
         other = _coerce(other, 3)
         if other is None:
             return NotImplemented
 
-        return self.__class__(*map(lambda i: i[0] / i[1], zip(self.inner, other.inner)))
+        return self.__class__(self.x / other.x, self.y / other.y, self.z / other.z)
 
     def __mul__(self, other):
+        if isinstance(other, (int, float)):
+            return self.__class__(self.x * other, self.y * other, self.z * other)
+
         other = _coerce(other, 3)
         if other is None:
             return NotImplemented
 
-        return self.__class__(*map(lambda i: i[0] * i[1], zip(self.inner, other.inner)))
+        return self.__class__(self.x * other.x, self.y * other.y, self.z * other.z)
 
     def __rmul__(self, other):
         return self.__mul__(other)
 
     def length(self):
-        return math.sqrt(sum(map(lambda i: i ** 2, self.inner)))
+        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
 
     def unit(self):
         len = self.length()
         if len == 0:
             return self
-        return self / _coerce(len, 3)
+        return self / len
+
+    def angle(self):
+        return math.atan2(self.y, self.x)
+
+    def dot(self, other):
+        return self.x * other.x + self.y * other.y + self.z * other.z
+
+    def is_zero(self):
+        return not (self.x or self.y or self.z)
+
+    @property
+    def inner(self):
+        if np is None:
+            return (self.x, self.y, self.z)
+        return np.array((self.x, self.y, self.z), dtype=np.double)
+
+class Vec2(Vec):
+    pass
+
+def _coerce_array(other):
+    if isinstance(other, VecArray):
+        return other.inner
+
+    if isinstance(other, Vec):
+        return other.inner
+
+    if type(other) is tuple:
+        return Vec(*other).inner
+
+    if isinstance(other, (int, float)):
+        return other
+
+    return None
+
+class _NumpyVecArray():
+    # N vectors stored as one contiguous (N, 3) array. It mirrors the Vec
+    # operators, but everything that returns a scalar for a Vec returns an
+    # array of N scalars here. Indexing gives back a plain Vec.
+    __slots__ = ["inner"]
+
+    @staticmethod
+    def from_vecs(vecs):
+        return VecArray(np.array([(v.x, v.y, v.z) for v in vecs], dtype=np.double).reshape(-1, 3))
+
+    def values(self):
+        return self.inner.ravel().tolist()
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def __len__(self):
+        return len(self.inner)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return VecArray(self.inner[key])
+
+        return Vec(*self.inner[key])
+
+    def __iter__(self):
+        for x, y, z in self.inner:
+            yield Vec(x, y, z)
+
+    def __add__(self, other):
+        other = _coerce_array(other)
+        if other is None:
+            return NotImplemented
+
+        return VecArray(self.inner + other)
+
+    def __sub__(self, other):
+        other = _coerce_array(other)
+        if other is None:
+            return NotImplemented
+
+        return VecArray(self.inner - other)
+
+    def __truediv__(self, other):
+        other = _coerce_array(other)
+        if other is None:
+            return NotImplemented
+
+        return VecArray(self.inner / other)
+
+    def __mul__(self, other):
+        other = _coerce_array(other)
+        if other is None:
+            return NotImplemented
+
+        return VecArray(self.inner * other)
+
+    def __rmul__(self, other):
+        return self.__mul__(other)
+
+    def length(self):
+        return np.sqrt(np.einsum("ij,ij->i", self.inner, self.inner))
+
+    def unit(self):
+        len = self.length()
+        len[len == 0] = 1
+        return VecArray(self.inner / len[:, np.newaxis])
 
     def angle(self):
-        return math.atan2(self.inner[1], self.inner[0])
+        return np.arctan2(self.inner[:, 1], self.inner[:, 0])
 
     def dot(self, other):
-        return sum(map(lambda i: i[0] * i[1], zip(self.inner, other.inner)))
+        other = _coerce_array(other)
+        return np.einsum("ij,ij->i", self.inner, np.broadcast_to(other, self.inner.shape))
 
     def is_zero(self):
-        return not np.any(self.inner)
+        return ~np.any(self.inner, axis=1)
+
+    def extents(self):
+        # (x0, y0, x1, y1) around all the vectors
+        (x0, y0) = self.inner[:, :2].min(axis=0).tolist()
+        (x1, y1) = self.inner[:, :2].max(axis=0).tolist()
+        return (x0, y0, x1, y1)
 
     @property
     def x(self):
-        return self.inner[0]
+        return self.inner[:, 0]
 
     @property
     def y(self):
-        return self.inner[1]
+        return self.inner[:, 1]
 
     @property
     def z(self):
-        return self.inner[2]
+        return self.inner[:, 2]
 
-class Vec2(Vec):
-    pass
+class _PythonVecArray():
+    # The VecArray of the python backend. inner is a list of (x, y, z) tuples,
+    # and where the numpy one gives arrays of scalars this gives lists.
+    __slots__ = ["inner"]
+
+    @staticmethod
+    def from_vecs(vecs):
+        return VecArray([(v.x, v.y, v.z) for v in vecs])
+
+    def values(self):
+        return [c for v in self.inner for c in v]
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def __len__(self):
+        return len(self.inner)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return VecArray(self.inner[key])
+
+        return Vec(*self.inner[key])
+
+    def __iter__(self):
+        for x, y, z in self.inner:
+            yield Vec(x, y, z)
+
+    def _pairs(self, other):
+        # Every vector along with what it's combined with, or None
+        if isinstance(other, VecArray):
+            return zip(self.inner, other.inner)
+
+        if type(other) is tuple:
+            other = Vec(*other)
+        if isinstance(other, Vec):
+            other = (other.x, other.y, other.z)
+        elif isinstance(other, (int, float)):
+            other = (other, other, other)
+        else:
+            return None
+
+        return ((v, other) for v in self.inner)
+
+    def __add__(self, other):
+        pairs = self._pairs(other)
+        if pairs is None:
+            return NotImplemented
+
+        return VecArray([(x + ox, y + oy, z + oz) for ((x, y, z), (ox, oy, oz)) in pairs])
+
+    def __sub__(self, other):
+        pairs = self._pairs(other)
+        if pairs is None:
+            return NotImplemented
+
+        return VecArray([(x - ox, y - oy, z - oz) for ((x, y, z), (ox, oy, oz)) in pairs])
+
+    def __truediv__(self, other):
+        pairs = self._pairs(other)
+        if pairs is None:
+            return NotImplemented
+
+        return VecArray([(x / ox, y / oy, z / oz) for ((x, y, z), (ox, oy, oz)) in pairs])
+
+    def __mul__(self, other):
+        pairs = self._pairs(other)
+        if pairs is None:
+            return NotImplemented
+
+        return VecArray([(x * ox, y * oy, z * oz) for ((x, y, z), (ox, oy, oz)) in pairs])
+
+    def __rmul__(self, other):
+        return self.__mul__(other)
+
+    def length(self):
+        return [math.sqrt(x * x + y * y + z * z) for (x, y, z) in self.inner]
+
+    def unit(self):
+        out = []
+        for (x, y, z), len in zip(self.inner, self.length()):
+            len = len or 1
+            out.append((x / len, y / len, z / len))
+        return VecArray(out)
+
+    def angle(self):
+        return [math.atan2(y, x) for (x, y, _) in self.inner]
+
+    def dot(self, other):
+        return [x * ox + y * oy + z * oz for ((x, y, z), (ox, oy, oz)) in self._pairs(other)]
+
+    def is_zero(self):
+        return [not (x or y or z) for (x, y, z) in self.inner]
+
+    def extents(self):
+        xs = [v[0] for v in self.inner]
+        ys = [v[1] for v in self.inner]
+        return (min(xs), min(ys), max(xs), max(ys))
+
+    @property
+    def x(self):
+        return [v[0] for v in self.inner]
+
+    @property
+    def y(self):
+        return [v[1] for v in self.inner]
+
+    @property
+    def z(self):
+        return [v[2] for v in self.inner]
+
+VecArray = _NumpyVecArray if np is not None else _PythonVecArray
 
 class Mat4():
+    # A 3D affine transform. What inner holds depends on the backend, planar()
+    # and as_vec() are the way to read one out.
     __slots__ = ["inner"]
 
     @staticmethod
     def identity():
-        return Mat4(np.array([
+        return Mat4(_matrix([
             [ 1,  0,  0, 0],
             [ 0,  1,  0, 0],
             [ 0,  0,  1, 0],
             [ 0,  0,  0, 1],
-        ], dtype=np.double))
+        ]))
 
     @staticmethod
     def translate(dx=0., dy=0., dz=0.):
-        return Mat4(np.array([
+        return Mat4(_matrix([
             [ 1,  0, 0, dx],
             [ 0,  1, 0, dy],
             [ 0,  0, 1, dz],
             [ 0,  0, 0,  1],
-        ], dtype=np.double))
+        ]))
 
     @staticmethod
     def scale(sx=1.0, sy=1.0, sz=1.0):
-        return Mat4(np.array([
+        return Mat4(_matrix([
             [sx,  0,  0, 0],
             [ 0, sy,  0, 0],
             [ 0,  0, sz, 0],
             [ 0,  0,  0, 1],
-        ], dtype=np.double))
+        ]))
 
     @staticmethod
     def rotx(theta=0.0):
-        return Mat4(np.array([
+        return Mat4(_matrix([
             [1, 0, 0, 0],
             [0, math.cos(theta), -math.sin(theta), 0],
             [0, math.sin(theta), math.cos(theta), 0],
             [ 0, 0, 0, 1],
-        ], dtype=np.double))
+        ]))
 
     @staticmethod
     def roty(theta=0.0):
-        return Mat4(np.array([
+        return Mat4(_matrix([
             [ math.cos(theta), 0, math.sin(theta), 0],
             [0, 1, 0, 0],
             [-math.sin(theta), 0, math.cos(theta), 0],
             [0, 0, 0, 1],
-        ], dtype=np.double))
+        ]))
 
     @staticmethod
     def rotz(theta=0.0):
-        return Mat4(np.array([
+        return Mat4(_matrix([
             [ math.cos(theta), -math.sin(theta), 0, 0],
             [ math.sin(theta),  math.cos(theta), 0, 0],
             [0, 0, 1, 0],
             [0, 0, 0, 1],
-        ], dtype=np.double))
+        ]))
 
     def __init__(self, mat):
         self.inner = mat
 
     def __mul__(self, other):
         if isinstance(other, Vec):
-            return other.__class__(*np.dot(self.inner, np.array((*other.inner, 1)))[:3])
+            return other.__class__(*_apply(self.inner, other.x, other.y, other.z))
+
+        if isinstance(other, VecArray):
+            return VecArray(_apply_array(self.inner, other.inner))
 
-        return Mat4(np.dot(self.inner, other.inner))
+        return Mat4(_matmul(self.inner, other.inner))
 
     def linear(self):
-        new = np.copy(self.inner)
-        new[0:3, 3] = 0
-        new[3, 3] = 1
-        return Mat4(new)
+        return Mat4(_linear(self.inner))
 
     def affine(self):
-        new = np.copy(self.inner)
-        new[0:3, 0:3] = np.identity(3)
-        new[3, 0:3] = 0
-        return Mat4(new)
+        return Mat4(_affine(self.inner))
 
     def as_vec(self):
-        return Vec(*self.inner[0:3, 3])
+        return Vec(*_translation(self.inner))
+
+    def planar(self):
+        # The svg matrix(a b c d e f) coefficients, i.e. what happens to x/y
+        return _planar(self.inner)
+
+    def values(self):
+        return _values(self.inner)
+
+class Affine2():
+    # A planar affine transform, stored as the six coefficients of the svg
+    # matrix(a b c d e f). It maps (x, y) to (a*x + c*y + e, b*x + d*y + f)
+    # and leaves z untouched, which is all we need for the flat diagrams. It
+    # composes with Mat4 by promoting itself, so the two can be mixed freely.
+    __slots__ = ["a", "b", "c", "d", "e", "f"]
+
+    @staticmethod
+    def identity():
+        return Affine2(1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+    @staticmethod
+    def translate(dx=0., dy=0.):
+        return Affine2(1.0, 0.0, 0.0, 1.0, dx, dy)
+
+    @staticmethod
+    def scale(sx=1.0, sy=1.0):
+        return Affine2(sx, 0.0, 0.0, sy, 0.0, 0.0)
+
+    @staticmethod
+    def rotz(theta=0.0):
+        cos = math.cos(theta)
+        sin = math.sin(theta)
+        return Affine2(cos, sin, -sin, cos, 0.0, 0.0)
+
+    @staticmethod
+    def from_mat4(mat):
+        # Drops everything that touches z. This is exact for the x/y result of
+        # any chain of planar operations applied after the matrix.
+        return Affine2(*mat.planar())
+
+    def __init__(self, a, b, c, d, e, f):
+        self.a = float(a)
+        self.b = float(b)
+        self.c = float(c)
+        self.d = float(d)
+        self.e = float(e)
+        self.f = float(f)
+
+    def __mul__(self, other):
+        if isinstance(other, Affine2):
+            return Affine2(
+                self.a * other.a + self.c * other.b,
+                self.b * other.a + self.d * other.b,
+                self.a * other.c + self.c * other.d,
+                self.b * other.c + self.d * other.d,
+                self.a * other.e + self.c * other.f + self.e,
+                self.b * other.e + self.d * other.f + self.f,
+            )
+
+        if isinstance(other, Vec):
+            x, y = other.x, other.y
+            return other.__class__(
+                self.a * x + self.c * y + self.e,
+                self.b * x + self.d * y + self.f,
+                other.z,
+            )
+
+        if isinstance(other, VecArray):
+            m = other.inner
+            if np is None:
+                return VecArray([
+                    (self.a * x + self.c * y + self.e, self.b * x + self.d * y + self.f, z)
+                    for (x, y, z) in m
+                ])
+
+            out = np.empty_like(m)
+            out[:, 0] = self.a * m[:, 0] + self.c * m[:, 1] + self.e
+            out[:, 1] = self.b * m[:, 0] + self.d * m[:, 1] + self.f
+            out[:, 2] = m[:, 2]
+            return VecArray(out)
+
+        if isinstance(other, Mat4):
+            return Mat4(_matmul(self.inner, other.inner))
+
+        return NotImplemented
+
+    @property
+    def inner(self):
+        return _matrix([
+            [self.a, self.c, 0, self.e],
+            [self.b, self.d, 0, self.f],
+            [     0,      0, 1,      0],
+            [     0,      0, 0,      1],
+        ])
+
+    def linear(self):
+        return Affine2(self.a, self.b, self.c, self.d, 0.0, 0.0)
+
+    def affine(self):
+        return Affine2(1.0, 0.0, 0.0, 1.0, self.e, self.f)
+
+    def as_vec(self):
+        return Vec(self.e, self.f)
+
+    def planar(self):
+        return (self.a, self.b, self.c, self.d, self.e, self.f)
+
+    def __repr__(self):
+        return f"Affine2({self.a}, {self.b}, {self.c}, {self.d}, {self.e}, {self.f})"
@@ -0,0 +1,70 @@
+import os
+
+import batch
+import layoutcache
+
+LAYERED = """\
+import layout
+from scene import Scene
+
+nodes = list(range({n}))
+edges = [(a, (a * 7 + 3) % {n}) for a in nodes]
+scene = Scene(layout.layered(nodes, edges).elements())
+"""
+
+def write(directory, name, source):
+    with open(os.path.join(directory, name), "w") as f:
+        f.write(source)
+
+def test_exit_fails_only_that_definition(tmp_path):
+    write(tmp_path, "a.py", "import sys\nsys.exit(2)\n")
+    write(tmp_path, "b.py", "import sys\nprint('<svg/>')\nsys.exit(0)\n")
+    write(tmp_path, "c.py", LAYERED.format(n=10))
+
+    results = {r["name"]: r for r in batch.render_all(batch.definitions(tmp_path), tmp_path / "out", workers=1)}
+    assert "SystemExit: 2" in results["a.py"]["error"]
+    assert "error" not in results["b.py"]
+    assert "error" not in results["c.py"]
+    assert open(results["b.py"]["path"]).read() == "<svg/>\n"
+
+def test_dead_worker_fails_only_its_definition(tmp_path):
+    write(tmp_path, "crash.py", "import os\nos._exit(1)\n")
+    for i in range(12):
+        write(tmp_path, f"d{i:02}.py", LAYERED.format(n=10 + i))
+
+    results = list(batch.render_all(batch.definitions(tmp_path), tmp_path / "out", workers=4))
+    assert len(results) == 13
+    failed = [r for r in results if "error" in r]
+    assert [r["name"] for r in failed] == ["crash.py"]
+    assert "BrokenProcessPool" in failed[0]["error"]
+
+def test_several_crashes(tmp_path):
+    for i in range(3):
+        write(tmp_path, f"crash{i}.py", f"import os, time\ntime.sleep(0.0{i})\nos._exit(1)\n")
+    for i in range(6):
+        write(tmp_path, f"d{i}.py", LAYERED.format(n=10 + i))
+
+    results = list(batch.render_all(batch.definitions(tmp_path), tmp_path / "out", workers=4))
+    assert len(results) == 9
+    assert sorted(r["name"] for r in results if "error" in r) == ["crash0.py", "crash1.py", "crash2.py"]
+
+def test_printed_text_comes_before_the_svg(tmp_path):
+    write(tmp_path, "a.py", """\
+import sys
+import canvas
+print("<?xml version='1.0'?>")
+with canvas.SvgWriter(sys.stdout) as w:
+    w.write("<svg/>")
+""")
+    [result] = batch.render_all(batch.definitions(tmp_path), tmp_path / "out", workers=1)
+    assert open(result["path"]).read() == "<?xml version='1.0'?>\n<svg/>"
+
+def test_workers_save_the_layout_cache(tmp_path, monkeypatch):
+    path = tmp_path / "cache"
+    monkeypatch.setenv(layoutcache.ENV, str(path))
+    for i in range(8):
+        write(tmp_path, f"d{i}.py", LAYERED.format(n=10 + i))
+
+    results = list(batch.render_all(batch.definitions(tmp_path), tmp_path / "out", workers=4))
+    assert not any("error" in r for r in results)
+    assert len(layoutcache.LayoutCache(path).records) == 8
@@ -0,0 +1,88 @@
+import math
+import random
+
+import pytest
+
+from bounds import (
+    Bounds,
+    of_element,
+    of_elements,
+)
+from common import p
+from node import (
+    Circle,
+    Square,
+)
+from vec import Affine2
+
+
+def sampled_ellipse(transform, rx, ry, n=20000):
+    (a, b, c, d, e, f) = transform.planar()
+    xs = []
+    ys = []
+    for i in range(n):
+        t = 2 * math.pi * i / n
+        (cx, cy) = (rx * math.cos(t), ry * math.sin(t))
+        xs.append(a * cx + c * cy + e)
+        ys.append(b * cx + d * cy + f)
+    return Bounds.points(xs, ys)
+
+def test_rotated_rect_is_exact():
+    transform = Affine2.translate(10, 20) * Affine2.rotz(math.pi / 2)
+    assert tuple(Bounds.rect(transform, 100, 50)) == pytest.approx((-40, 20, 10, 120))
+
+def test_rotated_ellipse_is_exact():
+    # Tighter than the corners of the rotated bbox
+    transform = Affine2.translate(100, 100) * Affine2.rotz(math.pi / 4)
+    exact = Bounds.ellipse(transform, 50, 10)
+    assert tuple(exact) == pytest.approx(tuple(sampled_ellipse(transform, 50, 10)), abs=1e-3)
+    corners = Bounds.rect(transform * Affine2.translate(-50, -10), 100, 20)
+    assert corners.contains(exact)
+
+def random_transforms(rng, n):
+    return [
+        Affine2.translate(rng.uniform(-500, 500), rng.uniform(-500, 500))
+        * Affine2.rotz(rng.uniform(0, 2 * math.pi))
+        * Affine2.scale(rng.uniform(0.5, 2), rng.uniform(0.5, 2))
+        for _ in range(n)
+    ]
+
+def test_batches_match_one_at_a_time():
+    rng = random.Random(2)
+    transforms = random_transforms(rng, 200)
+    planars = [t.planar() for t in transforms]
+    ws = [rng.uniform(1, 100) for _ in transforms]
+    hs = [rng.uniform(1, 100) for _ in transforms]
+
+    rects = Bounds.union_all(Bounds.rect(t, w, h) for (t, w, h) in zip(transforms, ws, hs))
+    assert tuple(Bounds.rects(planars, ws, hs)) == pytest.approx(tuple(rects))
+    ellipses = Bounds.union_all(Bounds.ellipse(t, w, h) for (t, w, h) in zip(transforms, ws, hs))
+    assert tuple(Bounds.ellipses(planars, ws, hs)) == pytest.approx(tuple(ellipses))
+
+    assert Bounds.rects([], [], []).empty
+    assert Bounds.ellipses([], [], []).empty
+
+def test_of_elements_matches_each():
+    rng = random.Random(3)
+    elements = []
+    for _ in range(100):
+        pos = p(rng.uniform(-500, 500), rng.uniform(-500, 500))
+        if rng.random() < 0.5:
+            elements.append(Square(pos, rng.uniform(1, 100), rng.uniform(1, 100)))
+        else:
+            elements.append(Circle(pos, rng.uniform(1, 100)))
+
+    each = Bounds.union_all(of_element(e) for e in elements)
+    assert tuple(of_elements(elements)) == pytest.approx(tuple(each))
+
+def test_empty_union_and_contains():
+    empty = Bounds()
+    assert empty.empty
+    box = Bounds(0, 0, 10, 10)
+    assert empty.union(box) == box
+    assert (box | Bounds(20, -5, 30, 5)) == Bounds(0, -5, 30, 10)
+    assert box.contains(Bounds(1, 1, 9, 9))
+    assert not box.contains(Bounds(0, 1, 9, 9))
+    assert box.pad(5) == Bounds(-5, -5, 15, 15)
+    (x0, y0, x1, y1) = box
+    assert (x0, y0, x1, y1) == box.extents()
@@ -0,0 +1,91 @@
+import gzip
+import io
+import math
+import random
+
+import pytest
+
+import canvas
+from common import (
+    HDir,
+    VDir,
+    p,
+    path_vhv,
+)
+from node import (
+    Circle,
+    MultiLine,
+    Square,
+)
+from scene import Scene
+from vec import (
+    Affine2,
+    Mat4,
+)
+
+
+def small_scene():
+    scene = Scene()
+    s = scene.add(Square(p(0, 0, HDir.MIDDLE, VDir.MIDDLE), 100, 50))
+    c = scene.add(Circle(p(200, 150, HDir.MIDDLE, VDir.MIDDLE), 20))
+    scene.add(MultiLine(path_vhv(s.anchor(VDir.BELOW), c.anchor(VDir.ABOVE)), 5))
+    return scene
+
+def draw(out, **kwargs):
+    with canvas.SvgWriter(out, chunk_size=16, **kwargs) as w:
+        small_scene().draw(w)
+    return out.getvalue()
+
+def test_text_and_binary_streams_agree():
+    data = draw(io.BytesIO())
+    assert data.endswith(b"</svg>")
+    assert draw(io.StringIO()) == data.decode("utf-8")
+    assert gzip.decompress(draw(io.BytesIO(), compress=True)) == data
+
+def test_text_stream_with_buffer_gets_bytes():
+    out = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    with canvas.SvgWriter(out) as w:
+        small_scene().draw(w)
+    assert out.buffer.getvalue() == draw(io.BytesIO())
+
+def test_compressed_text_stream():
+    with pytest.raises(ValueError):
+        canvas.SvgWriter(io.StringIO(), compress=True)
+
+def test_text_printed_before_comes_first():
+    out = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    print("<!-- before -->", file=out)
+    # Every write is a chunk of its own
+    with canvas.SvgWriter(out, chunk_size=1) as w:
+        w.write("<svg>")
+        print("<!-- between -->", file=out)
+        w.write("</svg>")
+    assert out.buffer.getvalue() == b"<!-- before -->\n<svg><!-- between -->\n</svg>"
+
+def test_marker_defined_once():
+    for pass_write in (lambda w: w, lambda w: w.write):
+        out = io.BytesIO()
+        with canvas.SvgWriter(out) as w:
+            scene = small_scene()
+            scene.add(MultiLine([p(0, 0), p(50, 0), p(50, 50)], 5))
+            scene.draw(pass_write(w))
+        assert out.getvalue().count(b'<marker id="arrowhead"') == 1
+
+def test_size_covers_every_bbox():
+    rng = random.Random(5)
+    bboxes = []
+    for i in range(300):
+        pos = Mat4.translate(rng.uniform(-1000, 1000), rng.uniform(-1000, 1000)) * Mat4.rotz(rng.uniform(0, 6.3))
+        if i % 2:
+            pos = Affine2.from_mat4(pos)
+        bboxes.append((pos, (rng.uniform(1, 100), rng.uniform(1, 100))))
+
+    each = [canvas.extents(bbox) for bbox in bboxes]
+    (pos, dim) = canvas.size(iter(bboxes))
+    corner = pos.as_vec()
+    assert (corner.x, corner.y) == pytest.approx((min(e[0] for e in each), min(e[1] for e in each)))
+    assert (corner.x + dim.x, corner.y + dim.y) == pytest.approx((max(e[2] for e in each), max(e[3] for e in each)))
+
+def test_extents_of_a_rotated_bbox():
+    bbox = (Mat4.translate(10, 20) * Mat4.rotz(math.pi / 2), (100, 50))
+    assert canvas.extents(bbox) == pytest.approx((-40, 20, 10, 120))
@@ -0,0 +1,64 @@
+import io
+
+import pytest
+
+import canvas
+from common import (
+    HDir,
+    VDir,
+    p,
+    path_vhv,
+)
+from fragments import (
+    FragmentCache,
+    content_hash,
+)
+from node import (
+    Circle,
+    MultiLine,
+    Square,
+)
+from scene import Scene
+
+
+def grid_scene(n):
+    scene = Scene()
+    for i in range(n):
+        s = scene.add(Square(p((i % 10) * 150, (i // 10) * 250, HDir.MIDDLE, VDir.MIDDLE), 100, 50))
+        c = scene.add(Circle(p((i % 10) * 150 + 30, (i // 10) * 250 + 160, HDir.MIDDLE, VDir.MIDDLE), 20))
+        scene.add(MultiLine(path_vhv(s.anchor(VDir.BELOW), c.anchor(VDir.ABOVE)), 5))
+    return scene
+
+def draw(scene, **kwargs):
+    out = io.BytesIO()
+    with canvas.SvgWriter(out) as w:
+        scene.draw(w, **kwargs)
+    return out.getvalue()
+
+def test_same_as_drawing_every_element():
+    scene = grid_scene(30)
+    cache = FragmentCache()
+    expected = draw(scene)
+    assert draw(scene, fragments=cache) == expected
+    assert draw(scene, fragments=cache) == expected
+    assert cache.hits == len(scene)
+
+def test_changed_element_is_drawn_again():
+    scene = grid_scene(5)
+    cache = FragmentCache()
+    draw(scene, fragments=cache)
+    scene.elements[0].w = 120.0
+    misses = cache.misses
+    assert draw(scene, fragments=cache) == draw(scene)
+    assert cache.misses == misses + 1
+
+def test_content_hash():
+    (a, b) = (Square(p(0, 0), 10, 10), Square(p(0, 0), 10, 10))
+    assert content_hash(a) == content_hash(b)
+    b.h = 11
+    assert content_hash(a) != content_hash(b)
+    assert content_hash(Circle(p(0, 0), 10)) != content_hash(Square(p(0, 0), 10, 10))
+
+def test_no_fragments_with_workers():
+    with pytest.raises(ValueError):
+        draw(grid_scene(1), fragments=FragmentCache(), workers=2)
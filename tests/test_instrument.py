@@ -0,0 +1,29 @@
+import pytest
+
+import instrument
+import node
+import vec
+from common import p
+from node import MultiLine
+
+
+@pytest.fixture
+def counting():
+    instrument.enable()
+    instrument.reset()
+    yield
+    instrument.disable()
+    instrument.reset()
+
+def lines(n):
+    return [MultiLine([p(0, i), p(100, i), p(100, i + 100), p(200, i + 100)], 5) for i in range(n)]
+
+@pytest.mark.skipif(vec.BACKEND != "numpy", reason="counts numpy calls")
+def test_corner_rounding_counts_numpy(counting):
+    node.draw_lines(lambda s: None, lines(3))
+    assert instrument.report()["numpy"].get("sqrt", 0) > 0
+
+def test_lines_are_counted_once(counting):
+    node.draw_lines(lambda s: None, lines(4))
+    lines(1)[0].draw(lambda s: None)
+    assert instrument.report()["elements"]["MultiLine"]["draw"]["count"] == 5
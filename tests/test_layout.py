@@ -0,0 +1,87 @@
+import random
+
+import bounds
+import layout
+
+
+def center(elem):
+    (x0, y0, x1, y1) = bounds.of_element(elem)
+    return ((x0 + x1) / 2, (y0 + y1) / 2)
+
+def dummies(result, edges):
+    # Every layer an edge spans past the first takes a dummy node
+    return sum(abs(result.layers[b] - result.layers[a]) - 1 for (a, b) in edges if a != b)
+
+def chain_graph(n, seed=0):
+    rng = random.Random(seed)
+    return (list(range(n)), [(i, i + rng.randint(1, 3)) for i in range(n - 3)])
+
+def test_large_chain_graph_has_no_long_edges():
+    (nodes, edges) = chain_graph(10000)
+    result = layout.layered(nodes, edges)
+    assert dummies(result, edges) == 0
+    for (a, b) in edges:
+        assert result.layers[b] > result.layers[a]
+
+def test_sources_sit_above_their_successors():
+    # s only points at the end of a long chain, so it belongs right above it
+    nodes = ["a", "b", "c", "d", "s"]
+    result = layout.layered(nodes, [("a", "b"), ("b", "c"), ("c", "d"), ("s", "d")])
+    assert result.layers["s"] == result.layers["d"] - 1
+
+def test_sinks_sit_below_their_predecessors():
+    nodes = ["a", "b", "c", "d", "t"]
+    result = layout.layered(nodes, [("a", "b"), ("b", "c"), ("c", "d"), ("a", "t")])
+    assert result.layers["t"] == result.layers["a"] + 1
+
+def test_layers_keep_order_and_spacing():
+    (nodes, edges) = chain_graph(500, seed=3)
+    edges += [(0, 400), (17, 300), (250, 499)]
+    result = layout.layered(nodes, edges, node_gap=80, layer_gap=100)
+
+    rows = {}
+    for n in nodes:
+        (x, y) = center(result.nodes[n])
+        assert y == result.layers[n] * 100
+        rows.setdefault(result.layers[n], []).append(x)
+    for xs in rows.values():
+        xs.sort()
+        for (x0, x1) in zip(xs, xs[1:]):
+            assert x1 - x0 >= 80 - 1e-9
+
+def test_crossings_are_removed():
+    # Drawn in the given order these two edges cross
+    result = layout.layered(["a", "b", "c", "d"], [("a", "d"), ("b", "c")])
+    (ax, bx, cx, dx) = (center(result.nodes[n])[0] for n in "abcd")
+    assert (ax < bx) == (dx < cx)
+
+def test_cycles_and_self_loops():
+    nodes = [1, 2, 3]
+    edges = [(1, 2), (2, 3), (3, 1), (2, 2)]
+    result = layout.layered(nodes, edges)
+    assert len(result.edges) == len(edges)
+    assert result.edges[3] is None
+    assert all(line is not None for line in result.edges[:3])
+    assert len(set(result.layers.values())) == 3
+
+def test_edges_are_orthogonal_and_end_at_the_nodes():
+    rng = random.Random(5)
+    nodes = list(range(60))
+    edges = [(rng.randrange(max(1, i)), i) for i in range(1, 60)] + [(rng.randrange(60), rng.randrange(60)) for _ in range(30)]
+    result = layout.layered(nodes, edges, shape="square", w=40, h=20)
+
+    for (a, b), line in zip(edges, result.edges):
+        if a == b:
+            assert line is None
+            continue
+        points = [(v.x, v.y) for v in line.points]
+        for ((x0, y0), (x1, y1)) in zip(points, points[1:]):
+            assert abs(x0 - x1) < 1e-9 or abs(y0 - y1) < 1e-9
+
+        # Downward edges leave from the bottom, edges that point up from the
+        # top
+        (ax, ay) = center(result.nodes[a])
+        (bx, by) = center(result.nodes[b])
+        down = result.layers[b] > result.layers[a]
+        assert abs(points[0][0] - ax) < 1e-9 and abs(points[0][1] - (ay + 10 if down else ay - 10)) < 1e-9
+        assert abs(points[-1][0] - bx) < 1e-9 and abs(points[-1][1] - (by - 10 if down else by + 10)) < 1e-9
@@ -0,0 +1,69 @@
+import io
+import os
+
+import canvas
+import layout
+import layoutcache
+from scene import Scene
+
+
+def graph(n):
+    nodes = list(range(n))
+    edges = [(a, (a * 7 + 3) % n) for a in nodes] + [(a, a + 1) for a in range(n - 1)]
+    return (nodes, edges)
+
+def svg(result):
+    out = io.BytesIO()
+    with canvas.SvgWriter(out) as w:
+        Scene(result.elements()).draw(w)
+    return out.getvalue()
+
+def test_hit_draws_the_same(tmp_path):
+    path = str(tmp_path / "cache")
+    (nodes, edges) = graph(30)
+    expected = svg(layout.layered(nodes, edges))
+
+    cache = layoutcache.LayoutCache(path)
+    assert svg(layout.layered(nodes, edges, cache=cache)) == expected
+    cache.save()
+
+    cache = layoutcache.LayoutCache(path)
+    assert svg(layout.layered(nodes, edges, cache=cache)) == expected
+    assert (cache.hits, cache.misses) == (1, 0)
+
+def test_only_hits_doesnt_save(tmp_path):
+    path = str(tmp_path / "cache")
+    (nodes, edges) = graph(10)
+    cache = layoutcache.LayoutCache(path)
+    layout.layered(nodes, edges, cache=cache)
+    cache.save()
+    os.utime(path, (0, 0))
+
+    cache = layoutcache.LayoutCache(path)
+    layout.layered(nodes, edges, cache=cache)
+    cache.save()
+    assert os.stat(path).st_mtime == 0
+
+def test_save_merges(tmp_path):
+    path = str(tmp_path / "cache")
+    first = layoutcache.LayoutCache(path)
+    second = layoutcache.LayoutCache(path)
+    layout.layered(*graph(10), cache=first)
+    layout.layered(*graph(11), cache=second)
+    first.save()
+    second.save()
+    assert len(layoutcache.LayoutCache(path).records) == 2
+
+def test_active_cache(tmp_path):
+    path = str(tmp_path / "cache")
+    with layoutcache.LayoutCache(path) as cache:
+        assert layoutcache.default() is cache
+        layout.layered(*graph(10))
+    assert layoutcache.default() is None
+    assert len(layoutcache.LayoutCache(path).records) == 1
+
+def test_key_includes_the_code(monkeypatch):
+    key = layoutcache.key_of("test", 1, 2.0, "three")
+    assert layoutcache.key_of("test", 1, 2.0, "three") == key
+    monkeypatch.setattr(layoutcache, "code_version", lambda: b"changed")
+    assert layoutcache.key_of("test", 1, 2.0, "three") != key
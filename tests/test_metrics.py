@@ -0,0 +1,27 @@
+import pytest
+
+import metrics
+
+
+def test_width_is_the_sum_of_the_advances():
+    (width, ascent, descent) = metrics.measure("Hi", "Helvetica", 10)
+    assert width == pytest.approx((722 + 222) * 10 / 1000)
+    assert ascent == pytest.approx(7.18)
+    assert descent == pytest.approx(2.07)
+
+def test_scales_with_size():
+    (small, _, _) = metrics.measure("label", size=10)
+    (large, _, _) = metrics.measure("label", size=20)
+    assert large == pytest.approx(2 * small)
+
+def test_unknown_fonts_and_glyphs():
+    assert metrics.measure("abc", "No Such Font", 16) == metrics.measure("abc", metrics.DEFAULT_FONT, 16)
+    (width, _, _) = metrics.measure("é", "Helvetica", 1000)
+    assert width == metrics.HELVETICA.default
+
+def test_box_follows_anchor_and_baseline():
+    (width, ascent, descent) = metrics.measure("text")
+    height = ascent + descent
+    assert metrics.text_box("text", "start", "hanging") == (0, 0, width, height)
+    assert metrics.text_box("text", "end", "alphabetic") == (-width, -ascent, width, height)
+    assert metrics.text_box("text", "middle", "middle") == (-width / 2, -height / 2, width, height)
@@ -0,0 +1,144 @@
+import math
+import random
+
+import pytest
+
+import metrics
+import node
+from common import (
+    HDir,
+    VDir,
+    p,
+)
+from node import (
+    Circle,
+    MultiLine,
+    Square,
+    Text,
+)
+from vec import (
+    Affine2,
+    Vec2,
+)
+
+
+def test_draw_lines_same_as_drawing_each():
+    rng = random.Random(1)
+    lines = []
+    for _ in range(300):
+        points = [p(rng.uniform(0, 1000), rng.uniform(0, 1000)) for _ in range(rng.randrange(3, 12))]
+        # A straight run and a reversal, the corners that need care
+        (x, y) = (points[-1].position.e, points[-1].position.f)
+        points.extend((p(x + 50, y), p(x + 100, y), p(x + 50, y)))
+        lines.append(MultiLine(points, rng.choice([0, 5, 7.5])))
+
+    each = []
+    for line in lines:
+        line.draw(each.append)
+    batched = []
+    node.draw_lines(batched.append, lines)
+    assert "".join(batched) == "".join(each)
+
+def close(a, b):
+    return abs(a.x - b.x) < 1e-9 and abs(a.y - b.y) < 1e-9
+
+def test_sharp_path_goes_through_every_point():
+    line = MultiLine([p(0, 0), p(100, 0), p(100, 100)], 0)
+    assert line.length() == 200
+    (pos, tangent) = line.at_length(100)
+    assert close(pos, Vec2(100, 0))
+    (pos, tangent) = line.at_length(150)
+    assert close(pos, Vec2(100, 50))
+    assert close(tangent, Vec2(0, 1))
+    assert close(line.along(0.25).position.as_vec(), Vec2(50, 0))
+
+def test_rounded_path_cuts_the_corner():
+    radius = 10
+    line = MultiLine([p(0, 0), p(100, 0), p(100, 100)], radius)
+    # The corner is shorter than the two sides it replaces, and longer than
+    # the chord across it
+    assert 200 - 2 * radius + radius * 2 ** 0.5 < line.length() < 200
+    assert close(line.at_length(0)[0], Vec2(0, 0))
+    assert close(line.at_length(line.length())[0], Vec2(100, 100))
+    (pos, tangent) = line.at_length(50)
+    assert close(pos, Vec2(50, 0))
+    assert close(tangent, Vec2(1, 0))
+    # Past the corner the path is straight again, down the second side
+    (pos, _) = line.at_length(line.length() - 50)
+    assert close(pos, Vec2(100, 50))
+    assert close(line.along(1).position.as_vec(), Vec2(100, 100))
+
+def test_bbox_and_bounds_cover_the_points():
+    line = MultiLine([p(10, 5), p(-20, 40), p(30, -7)], 0)
+    (pos, (w, h)) = line.bbox()
+    assert (pos.planar()[4], pos.planar()[5], w, h) == (-20, -7, 50, 47)
+    assert tuple(line.bounds()) == (-20, -7, 30, 40)
+    assert all(type(v) is float for v in line.bounds())
+
+SQUARE_ANCHORS = [
+    (HDir.RIGHT,), (VDir.ABOVE, HDir.RIGHT), (VDir.ABOVE,), (VDir.ABOVE, HDir.LEFT),
+    (HDir.LEFT,), (VDir.BELOW, HDir.LEFT), (VDir.BELOW,), (VDir.BELOW, HDir.RIGHT),
+]
+
+def at(point):
+    # Anchors are placed by a Vec2 or by a transform
+    pos = point.position
+    return pos.as_vec() if hasattr(pos, "as_vec") else pos
+
+def same_point(a, b):
+    return (
+        close(at(a), at(b))
+        and a.halign == b.halign and a.valign == b.valign
+    )
+
+def test_cached_anchors_match_uncached():
+    node.anchor_cache_clear()
+    for args in SQUARE_ANCHORS:
+        for _ in range(2):
+            assert same_point(node.square_anchor(100, 50, *args), node.square_anchor.__wrapped__(100, 50, *args))
+    for i in range(16):
+        theta = i * math.pi / 8
+        for _ in range(2):
+            assert same_point(node.circle_edge(20, theta), node.circle_edge.__wrapped__(20, theta))
+
+    info = node.anchor_cache_info()
+    assert info["square"].hits == len(SQUARE_ANCHORS)
+    assert info["circle"].hits == 16
+
+    node.anchor_cache_clear()
+    assert node.anchor_cache_info()["square"].currsize == 0
+
+def test_elements_hand_out_their_own_anchors():
+    # The cached points are shared, the ones the elements give out are not
+    a = Square(p(0, 0), 100, 50)
+    b = Square(p(0, 0), 100, 50)
+    before = b.anchor(VDir.BELOW)
+    first = a.anchor(VDir.BELOW)
+    first.position = first.position * Affine2.translate(500, 0)
+    assert same_point(b.anchor(VDir.BELOW), before)
+
+    c = Circle(p(200, 100), 20)
+    assert close(at(c.edge(0)), Vec2(220, 100))
+    assert close(at(c.edge(math.pi / 2)), Vec2(200, 80))
+    assert c.edge(0) is not c.edge(0)
+
+def test_text_bbox_is_measured():
+    text = Text("Hello", p(100, 50, HDir.RIGHT, VDir.ABOVE), size=20)
+    (pos, (w, h)) = text.bbox()
+    (width, ascent, descent) = metrics.measure("Hello", metrics.DEFAULT_FONT, 20)
+    assert close(pos.as_vec(), Vec2(100, 50))
+    assert (w, h) == (width, ascent + descent)
+
+    (x0, y0, x1, y1) = text.bounds().extents()
+    assert (x0, y0) == pytest.approx((100, 50))
+    assert (x1, y1) == pytest.approx((100 + width, 50 + ascent + descent))
+
+def test_text_writes_only_the_font_it_was_given():
+    out = []
+    Text("a", p(0, 0)).draw(out.append)
+    assert "font-" not in "".join(out)
+
+    out = []
+    Text("a", p(0, 0), font="Arial", size=12).draw(out.append)
+    assert "font-family=\"Arial\"" in "".join(out)
+    assert "font-size=\"12\"" in "".join(out)
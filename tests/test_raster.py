@@ -0,0 +1,39 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from common import (
+    HDir,
+    VDir,
+    p,
+)
+from node import (
+    Circle,
+    Color,
+    Square,
+)
+from scene import Scene
+
+
+def test_empty_scene_is_background():
+    image = Scene().rasterize(64)
+    assert image.shape == (64, 64, 3)
+    assert image.dtype == np.uint8
+    assert (image == 255).all()
+    assert Scene().rasterize(64, 32).shape == (32, 64, 3)
+
+def test_shapes_are_drawn():
+    scene = Scene()
+    scene.add(Square(p(0, 0, HDir.MIDDLE, VDir.MIDDLE), 200, 100, fill=Color(0, 0, 255)))
+    scene.add(Circle(p(0, 200, HDir.MIDDLE, VDir.MIDDLE), 40))
+    image = scene.rasterize(128)
+    assert image.shape[1] == 128
+    # Taller than wide, like the scene
+    assert image.shape[0] > 128
+    assert (image != 255).any()
+    # The middle of the square is its fill
+    (h, w, _) = image.shape
+    (x0, y0, x1, y1) = scene.bounds
+    pad = 20
+    scale = w / (x1 - x0 + 2 * pad)
+    assert tuple(image[round((0 - y0 + pad) * scale), round((0 - x0 + pad) * scale)]) == (0, 0, 255)
@@ -0,0 +1,106 @@
+import io
+
+import pytest
+
+import bounds
+import canvas
+from common import (
+    HDir,
+    VDir,
+    adjust,
+    p,
+    path_vhv,
+)
+from node import (
+    Circle,
+    MultiLine,
+)
+from reactive import Tracker
+from scene import Scene
+
+
+def center(elem):
+    (x0, y0, x1, y1) = bounds.of_element(elem)
+    return ((x0 + x1) / 2, (y0 + y1) / 2)
+
+def build(scene, x=0, r=20):
+    # n1, n2 hanging below it, n3 below that, a line from n1 to n3 and an
+    # unrelated circle
+    n1 = scene.add(Circle(p(x, 0, HDir.MIDDLE, VDir.MIDDLE), r))
+    n2 = scene.add(Circle(adjust(n1.anchor(VDir.BELOW), (30, 40)), 20))
+    n3 = scene.add(Circle(adjust(n2.anchor(VDir.BELOW), (30, 40)), 20))
+    line = scene.add(MultiLine(path_vhv(n1.anchor(VDir.BELOW), n3.anchor(VDir.ABOVE)), 5))
+    other = scene.add(Circle(p(-300, 0, HDir.MIDDLE, VDir.MIDDLE), 20))
+    return (n1, n2, n3, line, other)
+
+def svg(scene):
+    out = io.BytesIO()
+    with canvas.SvgWriter(out) as w:
+        scene.draw(w)
+    return out.getvalue()
+
+def tracked_scene(**kwargs):
+    scene = Scene()
+    with Tracker(scene) as tracker:
+        elems = build(scene, **kwargs)
+    return (scene, tracker, elems)
+
+def test_dependencies():
+    (scene, tracker, (n1, n2, n3, line, other)) = tracked_scene()
+    # In build order, and only what depends on the element
+    assert tracker.affected(0) == [0, 1, 2, 3]
+    assert tracker.affected(1) == [1, 2, 3]
+    assert tracker.affected(2) == [2, 3]
+    assert tracker.affected(4) == [4]
+
+def test_move_is_like_building_there():
+    (scene, tracker, (n1, n2, n3, line, other)) = tracked_scene()
+    before = center(other)
+    tracker.move(n1, 50, 0)
+
+    expected = Scene()
+    build(expected, x=50)
+    assert svg(scene) == svg(expected)
+    assert center(n3) == pytest.approx((110, 160))
+    assert center(other) == before
+
+def test_rebuild_with_new_inputs():
+    (scene, tracker, (n1, n2, n3, line, other)) = tracked_scene()
+    tracker.rebuild(n1, p(0, 0, HDir.MIDDLE, VDir.MIDDLE), 40)
+
+    expected = Scene()
+    build(expected, r=40)
+    assert svg(scene) == svg(expected)
+
+def test_points_are_updated_in_place():
+    scene = Scene()
+    with Tracker(scene) as tracker:
+        n1 = scene.add(Circle(p(0, 0, HDir.MIDDLE, VDir.MIDDLE), 20))
+        below = adjust(n1.anchor(VDir.BELOW), (0, 40))
+        n2 = scene.add(Circle(below, 20))
+    tracker.move(n1, 0, 100)
+    assert below.position.as_vec().y == pytest.approx(160)
+    assert center(n2) == pytest.approx((0, 180))
+
+def test_scene_bounds_follow():
+    (scene, tracker, (n1, n2, n3, line, other)) = tracked_scene()
+    # other holds out the left edge, moving it in shrinks the bounds
+    tracker.move(other, 250, 0)
+    assert tuple(scene.bounds) == tuple(bounds.Bounds.union_all(bounds.of_element(e) for e in scene))
+    tracker.move(n1, 500, 0)
+    assert tuple(scene.bounds) == tuple(bounds.Bounds.union_all(bounds.of_element(e) for e in scene))
+    assert scene.bounds.x1 == pytest.approx(center(n3)[0] + 20)
+
+def test_move_needs_a_point():
+    scene = Scene()
+    with Tracker(scene) as tracker:
+        line = scene.add(MultiLine([p(0, 0), p(10, 0)], 5))
+    with pytest.raises(TypeError):
+        tracker.move(line, 1, 1)
+
+def test_nothing_recorded_outside():
+    tracker = Tracker()
+    with tracker:
+        pass
+    Circle(p(0, 0), 10)
+    assert tracker.records == []
@@ -0,0 +1,85 @@
+import random
+
+import bounds
+import layoutcache
+from common import (
+    HDir,
+    VDir,
+    p,
+)
+from node import Square
+from route import Router
+
+
+def square(x, y, w=100, h=50):
+    return Square(p(x, y, HDir.MIDDLE, VDir.MIDDLE), w, h)
+
+def coords(points):
+    out = []
+    for point in points:
+        v = point.position.as_vec()
+        out.append((v.x, v.y))
+    return out
+
+def crosses(a, b, box):
+    # Does the segment from a to b go through the inside of the box?
+    (x0, y0, x1, y1) = box
+    if abs(a[1] - b[1]) < 1e-9:
+        return y0 < a[1] < y1 and min(a[0], b[0]) < x1 and max(a[0], b[0]) > x0
+    return x0 < a[0] < x1 and min(a[1], b[1]) < y1 and max(a[1], b[1]) > y0
+
+def check(route, obstacles):
+    cs = coords(route)
+    for (a, b) in zip(cs, cs[1:]):
+        # Up to the rounding error of the anchors
+        assert abs(a[0] - b[0]) < 1e-9 or abs(a[1] - b[1]) < 1e-9
+        for obstacle in obstacles:
+            assert not crosses(a, b, tuple(bounds.of_element(obstacle)))
+
+def test_open_ground_is_a_straight_line():
+    a = square(0, 0)
+    b = square(0, 300)
+    route = Router([a, b]).route(a.anchor(VDir.BELOW), b.anchor(VDir.ABOVE))
+    assert len(route) == 2
+
+def test_goes_around_obstacles():
+    a = square(0, 0)
+    wall = square(300, 0, w=100, h=400)
+    b = square(600, 0)
+    obstacles = [a, wall, b]
+    route = Router(obstacles).route(a.anchor(HDir.RIGHT), b.anchor(HDir.LEFT))
+    check(route, obstacles)
+    assert len(route) > 2
+
+def test_random_obstacles():
+    rng = random.Random(4)
+    obstacles = [square(rng.uniform(0, 2000), rng.uniform(0, 2000), 60, 40) for _ in range(60)]
+    # Keep the ones that don't overlap, routes can't start inside another
+    # obstacle
+    placed = []
+    for obstacle in obstacles:
+        box = tuple(bounds.of_element(obstacle))
+        grown = (box[0] - 25, box[1] - 25, box[2] + 25, box[3] + 25)
+        if all(not _overlap(grown, tuple(bounds.of_element(o))) for o in placed):
+            placed.append(obstacle)
+
+    router = Router(placed)
+    pairs = [(placed[i].anchor(VDir.BELOW), placed[i + 1].anchor(VDir.ABOVE)) for i in range(len(placed) - 1)]
+    for route in router.route_all(pairs):
+        check(route, placed)
+
+def _overlap(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+def test_cached_routes_are_the_same(tmp_path):
+    a = square(0, 0)
+    wall = square(300, 0, w=100, h=400)
+    b = square(600, 0)
+    obstacles = [a, wall, b]
+    pairs = [(a.anchor(HDir.RIGHT), b.anchor(HDir.LEFT)), (a.anchor(VDir.BELOW), b.anchor(VDir.BELOW))]
+    expected = [coords(r) for r in Router(obstacles).route_all(pairs)]
+
+    cache = layoutcache.LayoutCache(str(tmp_path / "cache"))
+    assert [coords(r) for r in Router(obstacles, cache=cache).route_all(pairs)] == expected
+    assert [coords(r) for r in Router(obstacles, cache=cache).route_all(pairs)] == expected
+    assert cache.hits == 1
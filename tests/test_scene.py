@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+import node
+from bounds import (
+    Bounds,
+    of_elements,
+)
+from common import (
+    HDir,
+    VDir,
+    p,
+)
+from node import (
+    Circle,
+    Square,
+)
+from scene import Scene
+
+
+def random_elements(seed, n=200):
+    rng = random.Random(seed)
+    elements = []
+    for _ in range(n):
+        pos = p(rng.uniform(-500, 500), rng.uniform(-500, 500), HDir.MIDDLE, VDir.MIDDLE)
+        if rng.random() < 0.5:
+            elements.append(Square(pos, rng.uniform(1, 100), rng.uniform(1, 100)))
+        else:
+            elements.append(Circle(pos, rng.uniform(1, 50)))
+    return elements
+
+def test_bounds_follow_adds():
+    elements = random_elements(1)
+    scene = Scene(elements[:100])
+    assert len(scene) == 100
+    for elem in elements[100:]:
+        scene.add(elem)
+    assert list(scene) == elements
+    assert tuple(scene.bounds) == pytest.approx(tuple(of_elements(elements)))
+
+def test_bounds_grow_and_shrink_on_update():
+    elements = random_elements(2)
+    scene = Scene(elements)
+    before = tuple(scene.bounds)
+
+    far = Square(p(0, 0, HDir.MIDDLE, VDir.MIDDLE), 10, 10)
+    scene.add(far)
+    far.__init__(p(5000, 5000, HDir.MIDDLE, VDir.MIDDLE), 10, 10)
+    scene.update(far)
+    assert scene.bounds.x1 == pytest.approx(5005)
+
+    far.__init__(p(0, 0, HDir.MIDDLE, VDir.MIDDLE), 10, 10)
+    scene.update(far)
+    assert tuple(scene.bounds) == pytest.approx(before)
+
+    # Something that wasn't holding the bounds out can't move them
+    inner = Circle(p(0, 0, HDir.MIDDLE, VDir.MIDDLE), 5)
+    scene.add(inner)
+    inner.__init__(p(10, 10, HDir.MIDDLE, VDir.MIDDLE), 5)
+    scene.update(inner)
+    assert tuple(scene.bounds) == pytest.approx(before)
+
+def test_subset_bounds():
+    elements = random_elements(3)
+    scene = Scene(elements[:150])
+    subset = elements[10:20] + elements[160:170]
+    assert tuple(scene.subset_bounds(subset)) == pytest.approx(tuple(of_elements(subset)))
+    assert scene.subset_bounds([]) == Bounds()
+
+def test_fit_matches_node_fit():
+    elements = random_elements(4)
+    scene = Scene(elements)
+    for (pad, subset) in ((0, None), (20, None), (10, elements[:30])):
+        (pos, w, h) = scene.fit(pad, subset)
+        (expected, ew, eh) = node.fit(subset if subset is not None else elements, pad)
+        a = pos.position.as_vec()
+        b = expected.position.as_vec()
+        assert (a.x, a.y, w, h) == pytest.approx((b.x, b.y, ew, eh))
+        assert (pos.halign, pos.valign) == (expected.halign, expected.valign)
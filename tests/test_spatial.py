@@ -0,0 +1,44 @@
+import math
+import random
+
+from spatial import GridIndex
+
+
+def distance(ext, x, y):
+    (x0, y0, x1, y1) = ext
+    return math.hypot(max(x0 - x, 0, x - x1), max(y0 - y, 0, y - y1))
+
+def random_items(rng, n):
+    items = []
+    for i in range(n):
+        (x, y) = (rng.uniform(-1000, 1000), rng.uniform(-1000, 1000))
+        items.append((f"e{i}", (x, y, x + rng.uniform(0, 80), y + rng.uniform(0, 80))))
+    return items
+
+def test_nearest_matches_brute_force():
+    rng = random.Random(7)
+    items = random_items(rng, 500)
+    index = GridIndex(50)
+    for (elem, ext) in items:
+        index.insert(elem, ext)
+    exts = dict(items)
+
+    # Inside the occupied range, and far outside it
+    points = [(rng.uniform(-1200, 1200), rng.uniform(-1200, 1200)) for _ in range(100)]
+    points += [(1e6, 0), (-1e6, -1e6), (0, 3e5)]
+    for (x, y) in points:
+        for k in (1, 5):
+            found = [distance(exts[e], x, y) for e in index.nearest(x, y, k)]
+            assert found == sorted(distance(ext, x, y) for ext in exts.values())[:k]
+
+def test_nearest_after_remove():
+    index = GridIndex(10)
+    index.insert("a", (0, 0, 1, 1))
+    index.insert("b", (100, 100, 101, 101))
+    index.remove("a")
+    assert index.nearest(-500, -500) == ["b"]
+    index.remove("b")
+    assert index.nearest(0, 0) == []
+
+def test_nearest_empty():
+    assert GridIndex().nearest(0, 0) == []
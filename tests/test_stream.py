@@ -0,0 +1,116 @@
+import asyncio
+import gzip
+import io
+
+import canvas
+import stream
+from scene import Scene
+from vec import Affine2
+
+
+class Block():
+    # An element that writes a fixed amount of text, and counts how often
+    # it was drawn
+    drawn = 0
+
+    def __init__(self, i, size=1024):
+        self.i = i
+        self.size = size
+
+    def bbox(self):
+        return (Affine2.translate(self.i, 0), (1, 1))
+
+    def draw(self, write):
+        Block.drawn += 1
+        write(f"<!-- {self.i:08d} " + "x" * (self.size - 18) + " -->\n")
+
+def scene_of(n, size=1024):
+    Block.drawn = 0
+    return Scene(Block(i, size) for i in range(n))
+
+def drawn_bytes(scene):
+    out = io.BytesIO()
+    with canvas.SvgWriter(out) as w:
+        scene.draw(w)
+    return out.getvalue()
+
+async def collect(scene, **kwargs):
+    return b"".join([chunk async for chunk in stream.render(scene, **kwargs)])
+
+def test_same_bytes_as_draw():
+    scene = scene_of(300, 100)
+    expected = drawn_bytes(scene)
+    assert asyncio.run(collect(scene)) == expected
+    assert asyncio.run(collect(scene, batch_size=1, chunk_size=10)) == expected
+    assert gzip.decompress(asyncio.run(collect(scene, compress=True))) == expected
+
+def test_nothing_drawn_ahead_of_the_consumer():
+    scene = scene_of(100)
+
+    async def take(n):
+        chunks = stream.render(scene, batch_size=1, chunk_size=1)
+        for _ in range(n):
+            await chunks.__anext__()
+        await chunks.aclose()
+
+    asyncio.run(take(10))
+    # One element per chunk, the preamble going out with the first
+    assert Block.drawn == 10
+
+def test_yields_to_the_loop_between_batches():
+    scene = scene_of(100, 100)
+    ticks = []
+
+    async def main():
+        async def ticker():
+            while True:
+                ticks.append(Block.drawn)
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(ticker())
+        await collect(scene, batch_size=10)
+        task.cancel()
+
+    asyncio.run(main())
+    assert len(set(ticks)) >= 10
+
+def test_write_to_local_server():
+    # 16MB into a client that stops reading. write_to has to wait for it,
+    # instead of drawing everything into the transport's buffer.
+    scene = scene_of(16 * 1024)
+    expected = drawn_bytes(scene)
+    Block.drawn = 0
+
+    async def main():
+        done = asyncio.Event()
+
+        async def handle(reader, writer):
+            writer.transport.set_write_buffer_limits(high=1 << 16)
+            await stream.write_to(writer, scene, batch_size=16)
+            writer.close()
+            await writer.wait_closed()
+            done.set()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        (reader, writer) = await asyncio.open_connection("127.0.0.1", port)
+
+        data = bytearray(await reader.readexactly(1 << 16))
+        await asyncio.sleep(0.2)
+        stalled = Block.drawn
+
+        while True:
+            piece = await reader.read(1 << 16)
+            if not piece:
+                break
+            data += piece
+
+        await done.wait()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return (bytes(data), stalled)
+
+    (data, stalled) = asyncio.run(main())
+    assert data == expected
+    assert stalled < len(scene) // 2
@@ -0,0 +1,121 @@
+import math
+import random
+
+import pytest
+
+from vec import (
+    Affine2,
+    Mat4,
+    Vec,
+    Vec2,
+    VecArray,
+)
+
+
+def random_affine(rng):
+    return (
+        Affine2.translate(rng.uniform(-100, 100), rng.uniform(-100, 100))
+        * Affine2.rotz(rng.uniform(0, 2 * math.pi))
+        * Affine2.scale(rng.uniform(0.1, 3), rng.uniform(0.1, 3))
+    )
+
+def as_mat4(affine):
+    return Mat4.identity() * affine
+
+def test_affine_matches_mat4():
+    rng = random.Random(1)
+    for _ in range(100):
+        theta = rng.uniform(0, 2 * math.pi)
+        (dx, dy, sx, sy) = (rng.uniform(-100, 100) for _ in range(4))
+        affine = Affine2.translate(dx, dy) * Affine2.rotz(theta) * Affine2.scale(sx, sy)
+        mat = Mat4.translate(dx, dy) * Mat4.rotz(theta) * Mat4.scale(sx, sy)
+        assert affine.planar() == pytest.approx(mat.planar())
+
+        v = Vec(rng.uniform(-10, 10), rng.uniform(-10, 10), 3)
+        (a, b) = (affine * v, mat * v)
+        assert (a.x, a.y, a.z) == pytest.approx((b.x, b.y, b.z))
+
+def test_composes_with_mat4():
+    rng = random.Random(2)
+    a = random_affine(rng)
+    b = random_affine(rng)
+    assert (a * b).planar() == pytest.approx((as_mat4(a) * as_mat4(b)).planar())
+
+    # Mixed in either order it becomes a Mat4, which can rotate out of the
+    # plane
+    tilt = Mat4.rotx(0.3)
+    assert isinstance(a * tilt, Mat4)
+    assert (a * tilt).values() == pytest.approx((as_mat4(a) * tilt).values())
+    assert (tilt * a).values() == pytest.approx((tilt * as_mat4(a)).values())
+
+    assert Affine2.from_mat4(as_mat4(a)).planar() == pytest.approx(a.planar())
+
+def test_keeps_the_vec_type():
+    a = Affine2.translate(1, 2)
+    assert type(a * Vec2(0, 0)) is Vec2
+    assert type(a * Vec(0, 0)) is Vec
+
+def test_parts():
+    a = Affine2.translate(5, 6) * Affine2.scale(2, 3)
+    assert a.linear().planar() == (2, 0, 0, 3, 0, 0)
+    assert a.affine().planar() == (1, 0, 0, 1, 5, 6)
+    v = a.as_vec()
+    assert (v.x, v.y) == (5, 6)
+
+def test_transforms_arrays():
+    rng = random.Random(3)
+    a = random_affine(rng)
+    vecs = [Vec(rng.uniform(-10, 10), rng.uniform(-10, 10), rng.uniform(-1, 1)) for _ in range(50)]
+    moved = a * VecArray.from_vecs(vecs)
+    for (v, m) in zip(vecs, moved):
+        each = a * v
+        assert (m.x, m.y, m.z) == pytest.approx((each.x, each.y, each.z))
+
+def test_components_are_floats():
+    v = Vec(1, 2)
+    assert (type(v.x), type(v.y), type(v.z)) == (float, float, float)
+    assert (v + 1).x == 2.0
+    assert (v * (2, 3, 4)).y == 6.0
+    assert (v - Vec(1, 1)).x == 0.0
+    assert Vec(0, 0).is_zero()
+    assert Vec(0, 0).unit().is_zero()
+
+def test_arrays_match_each_vec():
+    rng = random.Random(4)
+    vecs = [Vec(rng.uniform(-10, 10), rng.uniform(-10, 10), rng.uniform(-1, 1)) for _ in range(50)]
+    vecs.append(Vec(0, 0))
+    array = VecArray.from_vecs(vecs)
+    other = Vec(1.5, -2, 0.5)
+    others = VecArray.from_vecs(list(reversed(vecs)))
+
+    def same(result, expected):
+        assert len(result) == len(expected)
+        for (r, e) in zip(result, expected):
+            assert (r.x, r.y, r.z) == pytest.approx((e.x, e.y, e.z))
+
+    same(array + other, [v + other for v in vecs])
+    same(array - other, [v - other for v in vecs])
+    same(array * 2.0, [v * 2.0 for v in vecs])
+    same(2.0 * array, [v * 2.0 for v in vecs])
+    same(array / 4.0, [v / 4.0 for v in vecs])
+    same(array + others, [a + b for (a, b) in zip(vecs, reversed(vecs))])
+    same(array.unit(), [v.unit() for v in vecs])
+
+    assert list(array.length()) == pytest.approx([v.length() for v in vecs])
+    assert list(array.angle()) == pytest.approx([v.angle() for v in vecs])
+    assert list(array.dot(other)) == pytest.approx([v.dot(other) for v in vecs])
+    assert list(array.is_zero()) == [v.is_zero() for v in vecs]
+    assert list(array.x) == pytest.approx([v.x for v in vecs])
+
+    xs = [v.x for v in vecs]
+    ys = [v.y for v in vecs]
+    assert array.extents() == pytest.approx((min(xs), min(ys), max(xs), max(ys)))
+
+def test_array_indexing():
+    array = VecArray.from_vecs([Vec(i, 2 * i) for i in range(10)])
+    assert len(array) == 10
+    v = array[3]
+    assert (v.x, v.y) == (3, 6)
+    assert len(array[2:5]) == 3
+    assert array[2:5][0].x == 2
+    assert array.values()[:6] == [0, 0, 0, 1, 2, 0]